@@ -0,0 +1,133 @@
+##
+## Copyright (C) 2016 Soenke J. Peters
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Decodes sigrok session files without sigrok:
+
+    python -m cyrf6936 capture.srzip -o delaysplit=2000 -A write:read:wait
+'''
+
+import argparse
+import sys
+
+from .offline import Engine, OUTPUT_ANN
+from . import parallel
+from .cache import DecodeCache
+from .srzip import WINDOW, open_capture, parse_samplerate
+
+def channels(args, capture):
+    '''Returns the bit numbers of the SPI channels, given by name or number.'''
+    chs = {}
+    for ch in ('clk', 'cs', 'mosi', 'miso'):
+        names = getattr(args, ch).split(',')
+        if all(n.isdigit() for n in names):
+            chs[ch] = int(names[0])
+        else:
+            chs[ch] = capture.channel(*names)
+        if chs[ch] is None and ch != 'miso':
+            raise ValueError('no {} channel ({}) in {}'.format(ch.upper(), getattr(args, ch), args.file))
+    return chs
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = 'cyrf6936',
+        description = 'Decode CYRF6936 SPI traffic in a sigrok session file.')
+    parser.add_argument('file', help = 'sigrok session file (.srzip), unpacked session directory '
+        'or raw logic dump (with --unitsize and --samplerate)')
+    parser.add_argument('-o', '--option', action = 'append', default = [],
+        metavar = 'ID=VALUE', help = 'decoder option')
+    parser.add_argument('-A', '--annotations', default = None,
+        metavar = 'CLASS[:CLASS...]', help = 'annotation classes to show')
+    parser.add_argument('--clk', default = 'CLK,SCK', help = 'CLK channel name(s) or number')
+    parser.add_argument('--cs', default = 'nCS,CS,CSN', help = 'CS# channel name(s) or number')
+    parser.add_argument('--mosi', default = 'MOSI,SDAT', help = 'MOSI channel name(s) or number')
+    parser.add_argument('--miso', default = 'MISO', help = 'MISO channel name(s) or number')
+    parser.add_argument('--window', type = int, default = WINDOW,
+        help = 'samples decoded at once (default %(default)s)')
+    parser.add_argument('-j', '--jobs', type = int, default = 1,
+        help = 'decode in this many processes, 0 for one per CPU (default %(default)s)')
+    parser.add_argument('--txlog', metavar = 'FILE',
+        help = 'write a binary transaction log to FILE instead of showing annotations')
+    parser.add_argument('--cache', metavar = 'DIR',
+        help = 'keep decode results in DIR and reuse them for the same capture and options')
+    parser.add_argument('--cache-size', type = int, default = 1024, metavar = 'MB',
+        help = 'size limit of the cache (default %(default)s)')
+    parser.add_argument('--unitsize', type = int, default = None, help = 'bytes per sample of a raw dump')
+    parser.add_argument('--samplerate', default = None, help = 'samplerate of a raw dump, e.g. "24 MHz"')
+    args = parser.parse_args(argv)
+
+    options = dict(o.split('=', 1) for o in args.option)
+
+    samplerate = None
+    if args.unitsize is not None:
+        if args.samplerate is None:
+            parser.error('--samplerate is required for raw dumps')
+        samplerate = parse_samplerate(args.samplerate)
+    capture = open_capture(args.file, args.unitsize, samplerate)
+    try:
+        chs = channels(args, capture)
+    except ValueError as e:
+        parser.error(str(e))
+
+    ids = None
+    classes = args.annotations.split(':') if args.annotations else None
+    def show(record):
+        ss, es, output_id, cls, data = record
+        if output_id == OUTPUT_ANN and (classes is None or ids[cls] in classes):
+            print(data)
+
+    if args.jobs != 1:
+        if args.txlog:
+            parser.error('--txlog is not supported with --jobs')
+        o = parallel.unsupported(options)
+        if o is not None:
+            parser.error('the {} option is not supported with --jobs'.format(o))
+
+    engine = Engine(options, capture.samplerate, output = show, txlog = args.txlog is not None)
+    ids = engine.classes()
+
+    # Options writing files need a decode.
+    files = args.txlog or any(options.get(o) for o in engine.decoder.file_options)
+    cache = None
+    if args.cache and not files:
+        cache = DecodeCache(args.cache, args.cache_size << 20)
+        key = cache.key(args.file, engine.decoder.options, channels = chs, unitsize = args.unitsize,
+            samplerate = capture.samplerate, parallel = args.jobs != 1)
+        cached = cache.get(key)
+        if cached is not None:
+            for record in cached:
+                show(record)
+            return
+        records = []
+        def output(record):
+            records.append(record)
+            show(record)
+        engine.output = output
+
+    if args.jobs != 1:
+        parallel.decode(args.file, chs, options, jobs = args.jobs, unitsize = args.unitsize,
+            samplerate = samplerate, window = args.window, output = engine.output)
+    else:
+        sampler = engine.sampler(**chs)
+        for window in capture.windows(args.window):
+            engine.feed_samples(sampler, window)
+        engine.end()
+        if args.txlog:
+            engine.txlog.save(args.txlog)
+    if cache is not None:
+        cache.put(key, records)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+##
+## Copyright (C) 2016 Soenke J. Peters
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Benchmarks of the decoder hot paths, runnable without libsigrokdecode:
+
+    python bench.py [-o results.json] [-b baseline.json]
+
+- regdecode.*: RegDecode.decode_bytes() per register (s per call)
+- decode.*: the Decoder.decode() byte loop on synthetic SPI traffic (s)
+- srzip.*: the sample capture end to end, sampling included (s, needs NumPy)
+- memory.*: peak memory per million transactions (bytes)
+
+All results are lower-is-better. Given a baseline written by an earlier
+run, results exceeding it by more than the tolerance are listed and the
+exit status is 1.
+'''
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = os.path.basename(os.path.dirname(os.path.abspath(__file__)))
+    importlib.import_module(__package__)
+
+from .pd import Decoder
+from .regdecode import RegDecode
+from .regs import regs
+from . import offline
+
+BYTE_SAMPLES = 16 # samples per SPI byte
+GAP_SAMPLES = 8 # samples between CS# edges and bytes
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'samples', 'samples-20170109120000.srzip')
+
+def transaction(events, t, cmd, mosi, miso = None, sdat = False):
+    '''Appends the SPI events of one CS# low period at sample 't', sending
+    the command byte 'cmd' followed by the bytes 'mosi' (and receiving
+    'miso'). With 'sdat', the data is on the MOSI line only (3-pin mode).
+    Returns the sample after the transaction.'''
+    if miso is None:
+        miso = [0] * len(mosi)
+    if sdat:
+        data = mosi if cmd & 0x80 else miso
+        data = [(cmd, None)] + [(b, None) for b in data]
+    else:
+        data = [(cmd, 0)] + list(zip(mosi, miso))
+    events.append((t, t, ('CS-CHANGE', 1, 0)))
+    t += GAP_SAMPLES
+    for b_mosi, b_miso in data:
+        events.append((t, t + BYTE_SAMPLES, ('DATA', b_mosi, b_miso)))
+        t += BYTE_SAMPLES
+    t += GAP_SAMPLES
+    events.append((t, t, ('CS-CHANGE', 0, 1)))
+    return t + GAP_SAMPLES
+
+def traffic(n, sdat = False):
+    '''Returns the SPI events of 'n' rounds of typical radio traffic:
+    register pokes, a 16 byte TX_BUFFER_ADR burst and IRQ status polling.'''
+    events = [(0, 0, ('CS-CHANGE', None, 1))]
+    t = 0
+    for i in range(n):
+        t = transaction(events, t, 0x80 | 0x00, [i % 0x50], sdat = sdat)     # CHANNEL_ADR
+        t = transaction(events, t, 0x80 | 0x02, [0x40], sdat = sdat)         # TX_CTRL_ADR: TX_CLR
+        t = transaction(events, t, 0x80 | 0x01, [0x10], sdat = sdat)         # TX_LENGTH_ADR
+        t = transaction(events, t, 0x80 | 0x20, range(16), sdat = sdat)      # TX_BUFFER_ADR
+        t = transaction(events, t, 0x80 | 0x02, [0x82], sdat = sdat)         # TX_CTRL_ADR: TX_GO
+        for j in range(4):
+            t = transaction(events, t, 0x04, [0], [0x20 | (j == 3) << 1], sdat = sdat) # TX_IRQ_STATUS_ADR
+        t = transaction(events, t, 0x08, [0], [0x0a], sdat = sdat)           # RX_STATUS_ADR
+    return events
+
+def mixed(n):
+    '''Returns the SPI events of 'n' rounds of traffic switching between
+    4-pin and 3-pin SPI through IO_CFG_ADR, polling TX_IRQ_STATUS_ADR in
+    both modes.'''
+    events = [(0, 0, ('CS-CHANGE', None, 1))]
+    t = 0
+    for i in range(n):
+        t = transaction(events, t, 0x80 | 0x0d, [0x02])                  # IO_CFG_ADR: SPI_3PIN
+        for j in range(4):
+            t = transaction(events, t, 0x04, [0], [0x20 | (j == 3) << 1], sdat = True)
+        t = transaction(events, t, 0x80 | 0x0d, [0x00], sdat = True)     # IO_CFG_ADR: 4-pin
+        for j in range(4):
+            t = transaction(events, t, 0x04, [0], [0x20 | (j == 3) << 1])
+    return events
+
+def pokes(n):
+    '''Returns the SPI events of 'n' writes and reads of every single byte
+    register.'''
+    events = [(0, 0, ('CS-CHANGE', None, 1))]
+    t = 0
+    single = [r for r, (name, width) in sorted(regs.items()) if width == 1]
+    for i in range(n):
+        for r in single:
+            t = transaction(events, t, 0x80 | r, [i & 0xff])
+            t = transaction(events, t, r, [0], [(i * 7) & 0xff])
+    return events
+
+def bursts(n):
+    '''Returns the SPI events of 'n' 16 byte TX_BUFFER_ADR writes and
+    RX_BUFFER_ADR reads.'''
+    events = [(0, 0, ('CS-CHANGE', None, 1))]
+    t = 0
+    for i in range(n):
+        payload = [(i + k) & 0xff for k in range(16)]
+        t = transaction(events, t, 0x80 | 0x20, payload)
+        t = transaction(events, t, 0x21, [0] * 16, payload)
+    return events
+
+def transactions(events):
+    '''Returns the number of CS# low periods in 'events'.'''
+    return sum(1 for e in events if e[2] == ('CS-CHANGE', 1, 0))
+
+def run(events, options = {}):
+    '''Feeds 'events' to a new decoder, returns the number of puts.'''
+    d = Decoder()
+    count = [0]
+    def sink(ss, es, output_id, data):
+        count[0] += 1
+    d.sink = sink
+    offline.configure(d, options, samplerate = 1000000)
+    decode = d.decode
+    for ss, es, data in events:
+        decode(ss, es, data)
+    return count[0]
+
+def best(f, repeat):
+    '''Returns the best time of 'repeat' runs of 'f'.'''
+    t_best = None
+    for i in range(repeat):
+        t = time.perf_counter()
+        f()
+        t = time.perf_counter() - t
+        t_best = t if t_best is None else min(t_best, t)
+    return t_best
+
+def bench_regdecode(results, repeat, calls = 2000):
+    for r, (name, width) in sorted(regs.items()):
+        if width == 1:
+            values = [bytes([v & 0xff]) for v in range(calls)]
+        else:
+            values = [bytes((v + k) & 0xff for k in range(width)) for v in range(calls)]
+        RegDecode.decode_bytes(r, values[0])
+        def f():
+            decode_bytes = RegDecode.decode_bytes
+            for v in values:
+                decode_bytes(r, v)
+        results['regdecode.' + name] = best(f, repeat) / calls
+
+def bench_decode(results, repeat, n):
+    events = traffic(n)
+    results['decode.radio_txlog'] = best(lambda: offline.Engine({}, 1000000, txlog = True).decode(events), repeat)
+    results['decode.radio_lazy'] = best(lambda: offline.Engine({}, 1000000, lazy = True).decode(events), repeat)
+    for name, events, options in (
+            ('radio', traffic(n), {}),
+            ('radio_inverted', traffic(n), {'invert_mosi': 'yes', 'invert_miso': 'yes'}),
+            ('radio_packets', traffic(n), {'packets': 'yes'}),
+            ('radio_polls', traffic(n), {'polls': 'yes'}),
+            ('radio_timing', traffic(n), {'timing': 10}),
+            ('radio_delays', traffic(n), {'delaysplit': 5, 'delaybuckets': 'yes'}),
+            ('radio_3pin', traffic(n, sdat = True), {'spi3pin': 'yes'}),
+            ('mixed', mixed(n), {}),
+            ('pokes', pokes(max(1, n // 40)), {}),
+            ('bursts', bursts(n), {})):
+        results['decode.' + name] = best(lambda: run(events, options), repeat)
+
+def bench_srzip(results, repeat):
+    try:
+        from .srzip import SrZip
+    except ImportError:
+        return
+    def decode(options):
+        capture = SrZip(SAMPLE)
+        engine = offline.Engine(options, capture.samplerate, output = lambda r: None)
+        sampler = engine.sampler(capture.channel('SCK'), capture.channel('CS'),
+            capture.channel('MOSI'), capture.channel('MISO'))
+        for w in capture.windows():
+            engine.feed_samples(sampler, w)
+    results['srzip.sample'] = best(lambda: decode({}), repeat)
+    results['srzip.sample_inverted'] = best(lambda: decode({'invert_mosi': 'yes', 'invert_miso': 'yes'}), repeat)
+
+def bench_memory(results, n):
+    events = traffic(n)
+    scale = 1000000 / transactions(events)
+    for name, f in (
+            ('decode', lambda: run(events)),
+            ('engine_records', lambda: offline.Engine({}, 1000000).decode(events)),
+            ('txlog', lambda: offline.Engine({}, 1000000, txlog = True).decode(events)),
+            ('lazy', lambda: offline.Engine({}, 1000000, lazy = True).decode(events))):
+        tracemalloc.start()
+        f()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results['memory.' + name] = int(peak * scale)
+
+def compare(results, baseline, tolerance):
+    '''Returns the (name, result, baseline) of results exceeding the
+    baseline by more than 'tolerance'.'''
+    slower = []
+    for name, value in sorted(results.items()):
+        base = baseline.get(name)
+        if base and value > base * (1 + tolerance):
+            slower.append((name, value, base))
+    return slower
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Benchmark the cyrf6936 decoder.')
+    parser.add_argument('-o', '--output', help = 'write the results to this JSON file')
+    parser.add_argument('-b', '--baseline', help = 'compare against the results in this JSON file')
+    parser.add_argument('-t', '--tolerance', type = float, default = 0.2,
+        help = 'allowed slowdown against the baseline (default %(default)s)')
+    parser.add_argument('-r', '--repeat', type = int, default = 5,
+        help = 'runs per benchmark, the best counts (default %(default)s)')
+    parser.add_argument('-n', '--rounds', type = int, default = 2000,
+        help = 'rounds of synthetic traffic (default %(default)s)')
+    args = parser.parse_args(argv)
+
+    results = {}
+    bench_regdecode(results, args.repeat)
+    bench_decode(results, args.repeat, args.rounds)
+    bench_srzip(results, args.repeat)
+    bench_memory(results, args.rounds)
+    for name, value in sorted(results.items()):
+        print('{:<40} {:>14.6g}'.format(name, value))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent = 1, sort_keys = True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        for name, value, base in slower:
+            print('SLOWER: {} {:.6g} (baseline {:.6g}, {:+.0%})'.format(name, value, base, value / base - 1))
+        return 1 if slower else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
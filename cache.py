@@ -0,0 +1,139 @@
+##
+## Copyright (C) 2016 Soenke J. Peters
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+On-disk cache of decode results, keyed by the content of the capture, the
+decoder options and the version of the decoder sources.
+'''
+
+import hashlib
+import json
+import os
+import pickle
+import sys
+import tempfile
+
+def file_hash(path, h = None):
+    '''Updates the hash 'h' (a new BLAKE2b hash if None) with the content
+    of the file 'path', or of all files in the directory 'path', and
+    returns it.'''
+    if h is None:
+        h = hashlib.blake2b(digest_size = 20)
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            h.update(name.encode() + b'\0')
+            file_hash(os.path.join(path, name), h)
+        return h
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h
+
+def sources():
+    '''Returns the paths of the modules of this package loaded so far,
+    i.e. those the decode results depend on.'''
+    package = __name__.rpartition('.')[0]
+    paths = set()
+    for name, module in list(sys.modules.items()):
+        if name == package or name.startswith(package + '.'):
+            path = getattr(module, '__file__', None)
+            if path is not None:
+                paths.add(os.path.abspath(path))
+    return sorted(paths)
+
+def sources_hash():
+    '''Returns a hash of the decoder sources.'''
+    h = hashlib.blake2b()
+    for path in sources():
+        h.update(os.path.basename(path).encode() + b'\0')
+        file_hash(path, h)
+    return h.hexdigest()
+
+class DecodeCache():
+    '''Decode results (lists of records, see offline.Engine) in the
+    directory 'path', using at most 'max_bytes'. The least recently used
+    results are removed when it grows larger.'''
+
+    def __init__(self, path, max_bytes = 1 << 30):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok = True)
+
+    def key(self, capture, options = {}, **params):
+        '''Returns the key for decoding the capture file or directory
+        'capture' with the decoder 'options'; 'params' are other settings
+        the result depends on, like channels or the samplerate.'''
+        h = file_hash(capture)
+        from .pd import Decoder
+        opts = {k: str(v) for k, v in options.items() if k not in Decoder.file_options}
+        h.update(json.dumps([opts, params, sources_hash()], sort_keys = True).encode())
+        return h.hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.path, key + '.pickle')
+
+    def get(self, key):
+        '''Returns the records stored for 'key', or None.'''
+        name = self.filename(key)
+        try:
+            with open(name, 'rb') as f:
+                records = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        # The modification time orders the entries for eviction.
+        os.utime(name)
+        return records
+
+    def put(self, key, records):
+        '''Stores the records 'records' for 'key'.'''
+        fd, tmp = tempfile.mkstemp(dir = self.path, suffix = '.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(records, f, protocol = pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.filename(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.evict()
+
+    def entries(self):
+        '''Returns the (mtime, size, path) of the stored results, least
+        recently used first.'''
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith('.pickle'):
+                continue
+            p = os.path.join(self.path, name)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        return sorted(entries)
+
+    def evict(self):
+        '''Removes the least recently used results until the cache fits
+        into 'max_bytes'.'''
+        entries = self.entries()
+        total = sum(size for mtime, size, p in entries)
+        for mtime, size, p in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+            total -= size
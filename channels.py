@@ -0,0 +1,158 @@
+##
+## Copyright (C) 2016 Soenke J. Peters
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Timeline of the radio channel, as set by CHANNEL_ADR writes.
+'''
+
+from array import array
+import json
+
+CHANNEL_ADR = 0x00
+CHANNEL_MSK = 0x7F
+CHANNELS = CHANNEL_MSK + 1
+# Histogram buckets: durations of 2**(n - 1) to 2**n - 1 samples.
+BUCKETS = 64
+
+class Stats():
+    '''Count, minimum, maximum, mean and variance of a series of values,
+    updated in constant time and memory.'''
+
+    def __init__(self):
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, v):
+        self.count += 1
+        if self.min is None or v < self.min:
+            self.min = v
+        if self.max is None or v > self.max:
+            self.max = v
+        # Welford's algorithm.
+        d = v - self.mean
+        self.mean += d / self.count
+        self.m2 += d * (v - self.mean)
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def report(self, scale = 1):
+        '''Returns the statistics as a dict, with the values multiplied
+        by 'scale'.'''
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'min': self.min * scale,
+            'max': self.max * scale,
+            'mean': self.mean * scale,
+            'stddev': self.variance() ** 0.5 * scale,
+        }
+
+class ChannelTimeline():
+    '''Collects the channel hops (changes of the channel written to
+    CHANNEL_ADR) as the parallel arrays 'samples' and 'channels', and
+    accounts for every hop in constant time:
+
+    - dwell: total samples spent on every channel
+    - visits: number of hops to every channel
+    - dwell_histogram: per channel, the number of dwell periods in every
+      power of two bucket (see BUCKETS)
+    - intervals: Stats of the samples between hops
+
+    The dwell on the channel after the last hop is left open.
+    '''
+
+    def __init__(self):
+        self.samples = array('q')
+        self.channels = array('B')
+        self.dwell = array('q', bytes(8 * CHANNELS))
+        self.visits = array('q', bytes(8 * CHANNELS))
+        self.dwell_histogram = {}
+        self.intervals = Stats()
+        self.channel = None
+        self.since = None
+        # Samplerate of the reports, if known.
+        self.samplerate = None
+
+    def __len__(self):
+        return len(self.samples)
+
+    def transaction(self, ss, es, addr, dir_wr, inc, data):
+        '''Transaction hook, see Decoder.transaction_hooks.'''
+        if addr == CHANNEL_ADR and dir_wr == 1:
+            self.hop(ss, data[0] & CHANNEL_MSK)
+
+    def hop(self, sample, channel):
+        '''Records setting the channel 'channel' at 'sample'.'''
+        if channel == self.channel:
+            return
+        if self.channel is not None:
+            dt = sample - self.since
+            self.dwell[self.channel] += dt
+            self.intervals.add(dt)
+            try:
+                hist = self.dwell_histogram[self.channel]
+            except KeyError:
+                hist = self.dwell_histogram[self.channel] = array('q', bytes(8 * BUCKETS))
+            hist[min(dt.bit_length(), BUCKETS - 1)] += 1
+        self.samples.append(sample)
+        self.channels.append(channel)
+        self.visits[channel] += 1
+        self.channel = channel
+        self.since = sample
+
+    def report(self, samplerate = None):
+        '''Returns the statistics as a dict, with times in us if the
+        samplerate (or 'self.samplerate') is known, in samples otherwise.'''
+        samplerate = samplerate or self.samplerate
+        scale = 1000000 / samplerate if samplerate else 1
+        channels = {}
+        for c in range(CHANNELS):
+            if not self.visits[c]:
+                continue
+            hist = self.dwell_histogram.get(c)
+            channels[c] = {
+                'visits': self.visits[c],
+                'dwell': self.dwell[c] * scale,
+                # [lower bound, count] of the non-empty buckets.
+                'dwell_histogram': [] if hist is None else
+                    [[(1 << b >> 1) * scale, n] for b, n in enumerate(hist) if n],
+            }
+        return {
+            'unit': 'us' if samplerate else 'samples',
+            'hops': len(self),
+            'intervals': self.intervals.report(scale),
+            'channels': channels,
+        }
+
+    def save(self, path, samplerate = None):
+        '''Writes the report and the hops to the file 'path' as JSON.'''
+        report = self.report(samplerate)
+        report['timeline'] = [list(self.samples), list(self.channels)]
+        with open(path, 'w') as f:
+            json.dump(report, f)
+            f.write('\n')
+
+    def to_numpy(self):
+        '''Returns the hops as NumPy arrays (samples, channels), sharing
+        the memory of the timeline.'''
+        import numpy as np
+        return (np.frombuffer(self.samples, dtype = np.int64),
+            np.frombuffer(self.channels, dtype = np.uint8))
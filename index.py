@@ -0,0 +1,178 @@
+##
+## Copyright (C) 2016 Soenke J. Peters
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+SQLite index of decoded transactions, queried without decoding again:
+
+    python -m cyrf6936.index capture.idx --reg RX_STATUS_ADR --read --flag RX_BAD_CRC
+'''
+
+import argparse
+import os
+import sqlite3
+import sys
+
+from .regdecode import RegDecode
+from . import regs # fills in the CYRF6936 registers
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    ss INTEGER NOT NULL,
+    es INTEGER NOT NULL,
+    addr INTEGER NOT NULL,
+    dir_wr INTEGER NOT NULL,
+    inc INTEGER NOT NULL,
+    value BLOB NOT NULL,
+    text TEXT,
+    warning TEXT
+);
+CREATE TABLE IF NOT EXISTS flags (
+    tx INTEGER NOT NULL,
+    flag TEXT NOT NULL
+);
+'''
+
+INDEXES = '''
+CREATE INDEX IF NOT EXISTS transactions_addr ON transactions (addr, dir_wr, ss);
+CREATE INDEX IF NOT EXISTS transactions_ss ON transactions (ss);
+CREATE INDEX IF NOT EXISTS flags_flag ON flags (flag, tx);
+'''
+
+class TransactionIndex():
+    '''Transactions with their decoded value and its flags in the SQLite
+    database 'path'. Transactions are added in batches of 'batch' and
+    decoded for the chip type 'chip'; the lookup indexes are created by
+    commit().'''
+
+    def __init__(self, path, batch = 10000, chip = None):
+        self.chip = chip
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.batch = batch
+        self.pending = []
+        self.next_id = self.db.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM transactions').fetchone()[0]
+
+    @classmethod
+    def create(cls, path, batch = 10000, chip = None):
+        '''Returns a new, empty index in 'path', replacing an existing one.'''
+        if os.path.exists(path):
+            os.remove(path)
+        return cls(path, batch, chip)
+
+    def add(self, ss, es, addr, dir_wr, inc, data):
+        '''Adds a transaction, see Decoder.transaction_hooks.'''
+        self.pending.append((ss, es, addr, dir_wr, inc, bytes(data)))
+        if len(self.pending) >= self.batch:
+            self.flush()
+
+    def add_log(self, log):
+        '''Adds all transactions of the TransactionLog 'log'.'''
+        for ss, es, addr, dir_wr, inc, data, warn in log.records():
+            self.add(ss, es, addr, dir_wr, inc, data)
+
+    def flush(self):
+        '''Writes the pending transactions.'''
+        rows = []
+        flags = []
+        i = self.next_id
+        for ss, es, addr, dir_wr, inc, data in self.pending:
+            text, warn = RegDecode.decode_bytes(addr, data, self.chip)
+            rows.append((i, ss, es, addr, dir_wr, inc, data, text, warn))
+            if not text.startswith('0x'):
+                flags.extend((i, f) for f in text.split(' | ') if f)
+            i += 1
+        self.db.executemany('INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        self.db.executemany('INSERT INTO flags VALUES (?, ?)', flags)
+        self.next_id = i
+        self.pending = []
+
+    def commit(self):
+        '''Writes the pending transactions, creates the lookup indexes and
+        commits.'''
+        self.flush()
+        self.db.executescript(INDEXES)
+        self.db.commit()
+
+    def close(self):
+        self.commit()
+        self.db.close()
+
+    def query(self, reg = None, dir_wr = None, start = None, stop = None, flag = None, limit = None):
+        '''Returns the transactions as (ss, es, addr, dir_wr, inc, value,
+        text, warning) tuples in sample order, optionally only those of the
+        register 'reg' (name or address), the direction 'dir_wr' (1 =
+        write, 0 = read), starting in the samples 'start' to 'stop' and
+        with the decoded flag 'flag'.'''
+        where = []
+        args = []
+        if reg is not None:
+            addr = RegDecode.addr(reg)
+            if addr is None:
+                raise KeyError('No such register "{}"'.format(reg))
+            where.append('addr = ?')
+            args.append(addr)
+        if dir_wr is not None:
+            where.append('dir_wr = ?')
+            args.append(dir_wr)
+        if start is not None:
+            where.append('ss >= ?')
+            args.append(start)
+        if stop is not None:
+            where.append('ss < ?')
+            args.append(stop)
+        if flag is not None:
+            where.append('id IN (SELECT tx FROM flags WHERE flag = ?)')
+            args.append(flag)
+        sql = 'SELECT ss, es, addr, dir_wr, inc, value, text, warning FROM transactions'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY ss'
+        if limit is not None:
+            sql += ' LIMIT {:d}'.format(limit)
+        return self.db.execute(sql, args).fetchall()
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM transactions').fetchone()[0] + len(self.pending)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = 'cyrf6936.index',
+        description = 'Query a CYRF6936 transaction index.')
+    parser.add_argument('file', help = 'index written with the "index" option')
+    parser.add_argument('--reg', help = 'register name or address')
+    parser.add_argument('--write', dest = 'dir_wr', action = 'store_const', const = 1, help = 'writes only')
+    parser.add_argument('--read', dest = 'dir_wr', action = 'store_const', const = 0, help = 'reads only')
+    parser.add_argument('--start', type = int, help = 'first sample')
+    parser.add_argument('--stop', type = int, help = 'last sample (exclusive)')
+    parser.add_argument('--flag', help = 'decoded flag, e.g. RX_BAD_CRC')
+    parser.add_argument('--limit', type = int)
+    args = parser.parse_args(argv)
+    # sqlite3 would create an empty index instead.
+    if not os.path.isfile(args.file):
+        parser.error('no such index: {}'.format(args.file))
+
+    reg = args.reg
+    if reg is not None and reg.lower().startswith('0x'):
+        reg = int(reg, 16)
+    index = TransactionIndex(args.file)
+    for ss, es, addr, dir_wr, inc, value, text, warn in index.query(reg, args.dir_wr,
+            args.start, args.stop, args.flag, args.limit):
+        name = RegDecode.name(addr) or hex(addr)
+        print('{}-{} {} {} "{}"{}'.format(ss, es, 'write' if dir_wr else 'read', name, text,
+            ' ({})'.format(warn) if warn else ''))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+##
+## Copyright (C) 2016 Soenke J. Peters
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Counters and timers for the decoder's hot path.
+'''
+
+import json
+import time
+import weakref
+
+class Profiler():
+    '''Counts and times what a Decoder does. install() replaces its
+    decode(), finish_command(), put_command() and put() methods by
+    instrumented ones on the instance, so a decoder without a profiler
+    runs the plain methods at no cost. The profiler only keeps a weak
+    reference to the decoder, so that saving it at the end of the stream
+    does not keep the decoder alive.'''
+
+    def __init__(self, decoder):
+        self.decoder = weakref.ref(decoder)
+        self.ids = [a[0] for a in decoder.annotations]
+        self.events = 0
+        self.bytes = 0
+        self.decode_time = 0.0
+        # By register address.
+        self.transactions = {}
+        self.render_time = {}
+        # By annotation class.
+        self.annotations = {}
+        self.mb_len_max = 0
+
+    def install(self):
+        d = self.decoder()
+        decode = d.decode
+        finish_command = d.finish_command
+        put_command = d.put_command
+        put = d.put
+        clock = time.perf_counter
+
+        def timed_decode(ss, es, data):
+            self.events += 1
+            if data[0] == 'DATA':
+                self.bytes += 1
+            t = clock()
+            try:
+                decode(ss, es, data)
+            finally:
+                self.decode_time += clock() - t
+
+        def counted_finish_command(pos):
+            addr = d.addr
+            self.transactions[addr] = self.transactions.get(addr, 0) + 1
+            if d.mb_len > self.mb_len_max:
+                self.mb_len_max = d.mb_len
+            finish_command(pos)
+
+        def timed_put_command(pos, addr, dir_wr, inc, value):
+            t = clock()
+            put_command(pos, addr, dir_wr, inc, value)
+            self.render_time[addr] = self.render_time.get(addr, 0.0) + clock() - t
+
+        def counted_put(ss, es, output_id, data):
+            if output_id == d.out_ann:
+                cls = data[0]
+                self.annotations[cls] = self.annotations.get(cls, 0) + 1
+            put(ss, es, output_id, data)
+
+        d.decode = timed_decode
+        d.finish_command = counted_finish_command
+        d.put_command = timed_put_command
+        d.put = counted_put
+
+    def report(self):
+        '''Returns the counters as a dict.'''
+        from .pd import annotation_cache_stats
+        from .regdecode import RegDecode
+        def name(addr):
+            return RegDecode.name(addr) or hex(addr)
+        ids = self.ids
+        return {
+            'events': self.events,
+            'bytes': self.bytes,
+            'decode_time': self.decode_time,
+            'bytes_per_second': self.bytes / self.decode_time if self.decode_time else None,
+            'transactions': {name(a): n for a, n in sorted(self.transactions.items())},
+            'render_time': {'reg_0x{:02x}'.format(a): t for a, t in sorted(self.render_time.items())},
+            'annotations': {ids[c]: n for c, n in sorted(self.annotations.items())},
+            'mb_len_max': self.mb_len_max,
+            'annotation_cache': annotation_cache_stats(),
+        }
+
+    def save(self, path):
+        '''Writes the report to the file 'path' as JSON.'''
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent = 2, sort_keys = True)
+            f.write('\n')
@@ -0,0 +1,171 @@
+##
+## Copyright (C) 2016 Soenke J. Peters
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Pure-Python stand-in for the parts of the 'sigrokdecode' module used by
+the decoder, so that it can run outside of libsigrokdecode.
+'''
+
+OUTPUT_ANN = 0
+OUTPUT_PYTHON = 1
+OUTPUT_BINARY = 2
+OUTPUT_META = 3
+
+SRD_CONF_SAMPLERATE = 10000
+
+# The Engine calls Decoder.end() at the end of the stream.
+OFFLINE = True
+
+class Decoder():
+    '''Base class replacing sigrokdecode.Decoder. Everything the decoder
+    puts is handed to 'self.sink(ss, es, output_id, data)'.'''
+
+    def sink(self, ss, es, output_id, data):
+        pass
+
+    def register(self, output_type):
+        return output_type
+
+    def put(self, ss, es, output_id, data):
+        self.sink(ss, es, output_id, data)
+
+def configure(decoder, options = {}, samplerate = None):
+    '''Sets the options of 'decoder' (falling back to the defaults of its
+    option descriptions), starts it and passes the samplerate.'''
+    opts = {o['id']: o['default'] for o in type(decoder).options}
+    for k, v in options.items():
+        if k not in opts:
+            raise KeyError('No such option "{}"'.format(k))
+        opts[k] = v
+    decoder.options = opts
+    decoder.start()
+    if samplerate is not None:
+        decoder.metadata(SRD_CONF_SAMPLERATE, samplerate)
+    return decoder
+
+class Engine():
+    '''Runs the decoder on SPI events without libsigrokdecode.
+
+    Events are (ss, es, (ptype, data1, data2)) tuples, as put by the
+    'spi' PD. Everything the decoder puts becomes a (ss, es, output, cls,
+    data) record, with 'output' being OUTPUT_ANN (data is the annotation
+    text) or OUTPUT_BINARY (data is bytes). Records are collected in
+    'records', or passed to the callable 'output' if given, which keeps
+    the memory bounded when streaming.
+
+    If 'txlog' is true, transactions are collected in the
+    TransactionLog 'txlog' instead of being put as annotations.
+
+    If 'lazy' is true, the data of the write/read annotations is the
+    (addr, dir_wr, inc, payload, chip) tuple of the transaction, and the text
+    and the warning for the value are rendered when asked for by
+    render() or annotations().'''
+
+    def __init__(self, options = {}, samplerate = None, output = None, txlog = False, lazy = False):
+        from .pd import Decoder
+        self.records = []
+        self.output = self.records.append if output is None else output
+        self.decoder = Decoder()
+        self.decoder.sink = self.put
+        configure(self.decoder, options, samplerate)
+        self.txlog = None
+        if txlog:
+            from .txlog import TransactionLog
+            self.txlog = TransactionLog(self.decoder.chip)
+            self.decoder.transaction_hooks.append(self.txlog.append)
+            self.decoder.annotate = False
+        self.decoder.lazy = lazy
+
+    def put(self, ss, es, output_id, data):
+        if output_id == OUTPUT_ANN:
+            self.output((ss, es, output_id, data[0], data[1][0]))
+        else:
+            self.output((ss, es, output_id, data[0], data[1]))
+
+    def classes(self):
+        '''Returns the annotation class ids, indexed by class.'''
+        return [a[0] for a in self.decoder.annotations]
+
+    def sampler(self, clk, cs, mosi, miso = None, cpol = 0, cpha = 0, offset = 0):
+        '''Returns a SpiSampler (see srzip) for logic samples with the SPI
+        channels 'clk', 'cs', 'mosi' and 'miso' (None for SDAT on 'mosi'),
+        whose events are fed to this engine. The sampler inverts MOSI/MISO
+        as set by the decoder options, for all bytes at once, so the
+        decoder does not have to.'''
+        from .srzip import SpiSampler
+        d = self.decoder
+        sampler = SpiSampler(clk, cs, mosi, miso, cpol, cpha, offset,
+            invert_mosi = d.invert_mosi, invert_miso = d.invert_miso)
+        d.invert = False
+        return sampler
+
+    def feed_samples(self, sampler, samples):
+        '''Decodes the logic samples 'samples' with 'sampler' (see
+        sampler()).'''
+        self.feed(sampler.feed(samples))
+
+    def feed(self, events):
+        '''Decodes the SPI events 'events'.'''
+        decode = self.decoder.decode
+        for ss, es, data in events:
+            decode(ss, es, data)
+
+    def end(self):
+        '''Ends the stream.'''
+        self.decoder.end()
+
+    def decode(self, events):
+        '''Decodes the SPI events 'events', ends the stream and returns
+        all records.'''
+        self.feed(events)
+        self.end()
+        return self.records
+
+    def render(self, record):
+        '''Returns the records with text 'record' stands for: itself, or
+        for a transaction of a lazy decoder its annotation followed by the
+        warning for the value, if any.'''
+        ss, es, output_id, cls, data = record
+        if output_id != OUTPUT_ANN or not isinstance(data, tuple):
+            return [record]
+        from .pd import render_command
+        text, warn = render_command(*data)
+        if warn is None:
+            return [(ss, es, output_id, cls, text)]
+        return [(ss, es, output_id, cls, text), (ss, es, output_id, self.decoder.ann_warn, warn)]
+
+    def annotations(self, classes = None, start = None, stop = None):
+        '''Yields the (ss, es, class id, text) of the annotations, optionally
+        only those of the annotation class ids in 'classes' and those
+        overlapping the samples 'start' to 'stop'. Transactions of a lazy
+        decoder are rendered only if needed.'''
+        ids = self.classes()
+        warnings = classes is None or ids[self.decoder.ann_warn] in classes
+        for record in self.records:
+            ss, es, output_id, cls, data = record
+            if output_id != OUTPUT_ANN:
+                continue
+            if (start is not None and es < start) or (stop is not None and ss >= stop):
+                continue
+            wanted = classes is None or ids[cls] in classes
+            if isinstance(data, tuple):
+                if not (wanted or warnings):
+                    continue
+                for ss, es, output_id, c, text in self.render(record):
+                    if classes is None or ids[c] in classes:
+                        yield ss, es, ids[c], text
+            elif wanted:
+                yield ss, es, ids[cls], data
@@ -0,0 +1,210 @@
+##
+## Copyright (C) 2016 Soenke J. Peters
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Groups register transactions into radio packets.
+
+A packet is sent by writing TX_LENGTH_ADR, clearing the buffer (TX_CLR in
+TX_CTRL_ADR), writing TX_BUFFER_ADR, setting TX_GO and polling
+TX_IRQ_STATUS_ADR until TXC_IRQ or TXE_IRQ is set. A packet is received
+by setting RX_GO in RX_CTRL_ADR, polling RX_IRQ_STATUS_ADR until RXC_IRQ
+or RXE_IRQ is set and reading RX_COUNT_ADR and RX_BUFFER_ADR.
+'''
+
+import functools
+
+CHANNEL_ADR = 0x00
+TX_LENGTH_ADR = 0x01
+TX_CTRL_ADR = 0x02
+TX_IRQ_STATUS_ADR = 0x04
+RX_CTRL_ADR = 0x05
+RX_IRQ_STATUS_ADR = 0x07
+RX_STATUS_ADR = 0x08
+RX_COUNT_ADR = 0x09
+TX_BUFFER_ADR = 0x20
+RX_BUFFER_ADR = 0x21
+SOP_CODE_ADR = 0x22
+DATA_CODE_ADR = 0x23
+
+TX_GO = 0x80
+TX_CLR = 0x40
+RX_GO = 0x80
+# TXC_IRQ/TXE_IRQ and RXC_IRQ/RXE_IRQ
+IRQ_DONE = 0x03
+IRQ_ERROR = 0x01
+# Size of the TX buffer, further TX_BUFFER_ADR writes are dropped.
+TX_FIFO_SIZE = 16
+# Channel number in CHANNEL_ADR, bit 7 is reserved.
+CHANNEL_MSK = 0x7F
+
+def packet_text(packet, samplerate = None):
+    '''Returns the label for a packet, see PacketAssembler.'''
+    direction, ss, es, channel, payload, sop, data_code, latency, irq, status = packet
+    args = ['channel={}'.format(channel), 'payload="0x{}"'.format(payload.hex().upper())]
+    if latency is not None:
+        if samplerate:
+            args.append('latency_us={:.2f}'.format(latency * 1000000 / samplerate))
+        else:
+            args.append('latency={}'.format(latency))
+    if irq is None:
+        args.append('incomplete')
+    elif irq & IRQ_ERROR:
+        args.append('error')
+    return '{}_packet({})'.format(direction.lower(), ', '.join(args))
+
+class PacketAssembler():
+    '''Single pass state machine turning transactions, as passed to the
+    decoder's transaction hooks, into packets. Every packet is passed to
+    'output' as a tuple:
+
+    - direction: 'TX' or 'RX'
+    - ss: start sample of the TX_GO/RX_GO write
+    - es: end sample of the last transaction of the packet
+    - channel: value of CHANNEL_ADR, or None
+    - payload: bytes
+    - sop: SOP_CODE_ADR value, or None
+    - data_code: DATA_CODE_ADR value, or None
+    - latency: samples from the end of TX_GO/RX_GO to the start of the
+      IRQ status read reporting completion, or None
+    - irq: that IRQ status (TXC_IRQ/RXC_IRQ = 0x02, TXE_IRQ/RXE_IRQ =
+      0x01), or None if the packet was not completed
+    - status: value of RX_STATUS_ADR (RX only), or None
+    '''
+
+    def __init__(self, output):
+        self.output = output
+        self.channel = None
+        self.sop = None
+        self.data_code = None
+        self.tx_length = None
+        self.tx_buffer = bytearray()
+        # The packet on its way: [direction, ss, go_es, es, channel,
+        # payload, sop, data_code, latency, irq, status, count].
+        self.packet = None
+        # Handlers by address, everything else is ignored.
+        self.handlers = {
+            CHANNEL_ADR: self.on_channel,
+            TX_LENGTH_ADR: self.on_tx_length,
+            TX_CTRL_ADR: self.on_tx_ctrl,
+            TX_IRQ_STATUS_ADR: functools.partial(self.irq_status, 'TX'),
+            RX_CTRL_ADR: self.on_rx_ctrl,
+            RX_IRQ_STATUS_ADR: functools.partial(self.irq_status, 'RX'),
+            RX_STATUS_ADR: self.on_rx_status,
+            RX_COUNT_ADR: self.on_rx_count,
+            TX_BUFFER_ADR: self.on_tx_buffer,
+            RX_BUFFER_ADR: self.on_rx_buffer,
+            SOP_CODE_ADR: self.on_sop,
+            DATA_CODE_ADR: self.on_data_code,
+        }
+
+    def transaction(self, ss, es, addr, dir_wr, inc, data):
+        '''Transaction hook, see Decoder.transaction_hooks.'''
+        f = self.handlers.get(addr)
+        if f is not None:
+            f(ss, es, dir_wr, data)
+
+    def flush(self):
+        '''Puts the packet on its way, if any.'''
+        p = self.packet
+        if p is None:
+            return
+        self.packet = None
+        self.output((p[0], p[1], p[3], p[4], bytes(p[5]), p[6], p[7], p[8], p[9], p[10]))
+
+    def start(self, direction, ss, es, payload):
+        '''Starts a packet with the TX_GO/RX_GO write at 'ss' to 'es'.'''
+        self.flush()
+        self.packet = [direction, ss, es, es, self.channel, payload,
+            self.sop, self.data_code, None, None, None, None]
+
+    def on_channel(self, ss, es, dir_wr, data):
+        # Reads count too: they return the channel in use, which may have
+        # been written before the capture started.
+        self.channel = data[0] & CHANNEL_MSK
+
+    def on_sop(self, ss, es, dir_wr, data):
+        self.sop = bytes(data)
+
+    def on_data_code(self, ss, es, dir_wr, data):
+        self.data_code = bytes(data)
+
+    def on_tx_length(self, ss, es, dir_wr, data):
+        if dir_wr:
+            self.tx_length = data[0]
+
+    def on_tx_buffer(self, ss, es, dir_wr, data):
+        if dir_wr:
+            self.tx_buffer += data[:TX_FIFO_SIZE - len(self.tx_buffer)]
+
+    def on_tx_ctrl(self, ss, es, dir_wr, data):
+        if not dir_wr:
+            return
+        v = data[0]
+        if v & TX_CLR:
+            self.tx_buffer = bytearray()
+        if v & TX_GO:
+            # A copy, the buffer may be written while the packet is sent.
+            payload = bytes(self.tx_buffer)
+            if self.tx_length is not None:
+                payload = payload[:self.tx_length]
+            self.start('TX', ss, es, payload)
+
+    def on_rx_ctrl(self, ss, es, dir_wr, data):
+        if dir_wr and data[0] & RX_GO:
+            self.start('RX', ss, es, bytearray())
+
+    def irq_status(self, direction, ss, es, dir_wr, data):
+        '''Handles a TX_IRQ_STATUS_ADR ('TX') or RX_IRQ_STATUS_ADR ('RX')
+        transaction.'''
+        p = self.packet
+        if p is None or dir_wr or p[0] != direction or p[9] is not None:
+            return
+        irq = data[0] & IRQ_DONE
+        if irq:
+            p[8] = ss - p[2]
+            p[9] = irq
+            p[3] = es
+            if direction == 'TX':
+                self.flush()
+
+    def rx_packet(self, dir_wr):
+        '''Returns the completed RX packet being read out, or None.'''
+        p = self.packet
+        if p is None or dir_wr or p[0] != 'RX' or p[9] is None:
+            return None
+        return p
+
+    def on_rx_status(self, ss, es, dir_wr, data):
+        p = self.rx_packet(dir_wr)
+        if p is not None:
+            p[10] = data[0]
+            p[3] = es
+
+    def on_rx_count(self, ss, es, dir_wr, data):
+        p = self.rx_packet(dir_wr)
+        if p is not None:
+            p[11] = data[0]
+            p[3] = es
+
+    def on_rx_buffer(self, ss, es, dir_wr, data):
+        p = self.rx_packet(dir_wr)
+        if p is None:
+            return
+        p[5] += data
+        p[3] = es
+        if p[11] is not None and len(p[5]) >= p[11]:
+            del p[5][p[11]:]
+            self.flush()
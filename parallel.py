@@ -0,0 +1,137 @@
+##
+## Copyright (C) 2016 Soenke J. Peters
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Decodes captures in a process pool. A CS# rising edge resets the decoder,
+except for the SPI pin mode (spi3pin), so a capture is split at CS# rising
+edges and the pieces are decoded independently. The pin mode each piece
+starts with is checked afterwards, and pieces decoded with the wrong one
+are decoded again.
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import numpy as np
+
+from .offline import Engine, configure
+from .pd import Decoder
+from .srzip import WINDOW, open_capture
+
+def cs_rising_edge(capture, cs, start, size = WINDOW):
+    '''Returns the sample number of the first CS# rising edge after
+    sample 'start', or None.'''
+    last = None
+    pos = start
+    for window in capture.windows(size, start):
+        line = ((window >> cs) & 1).astype(np.int8)
+        if last is not None and last == 0 and line[0] == 1:
+            return pos
+        rising = np.flatnonzero(np.diff(line) == 1)
+        if len(rising):
+            return pos + int(rising[0]) + 1
+        last = line[-1]
+        pos += len(window)
+    return None
+
+def split(capture, cs, parts):
+    '''Returns the sample numbers splitting 'capture' into about 'parts'
+    pieces at CS# rising edges, including 0 and the capture length.'''
+    bounds = [0]
+    for k in range(1, parts):
+        target = max(capture.length * k // parts, bounds[-1])
+        edge = cs_rising_edge(capture, cs, target)
+        if edge is None:
+            break
+        if edge > bounds[-1]:
+            bounds.append(edge)
+    if capture.length > bounds[-1]:
+        bounds.append(capture.length)
+    return bounds
+
+def decode_range(path, unitsize, samplerate, channels, options, start, stop, spi3pin, window = WINDOW):
+    '''Decodes the samples 'start' to 'stop' of a capture (see
+    open_capture()), with the SPI pin mode 'spi3pin' in effect at 'start'.
+    Returns the records and the pin mode at 'stop'.'''
+    capture = open_capture(path, unitsize, samplerate)
+    engine = Engine(options, capture.samplerate)
+    engine.decoder.spi3pin = spi3pin
+    if start > 0:
+        # The piece starts on a CS# rising edge.
+        engine.decoder.wait_s = start
+    sampler = engine.sampler(offset = start, **channels)
+    for w in capture.windows(window, start, stop):
+        engine.feed_samples(sampler, w)
+    engine.end()
+    return engine.records, engine.decoder.spi3pin
+
+def unsupported(options):
+    '''Returns the first of the decoder 'options' that cannot be used when
+    decoding in pieces, or None.'''
+    for o in Decoder.file_options:
+        if options.get(o):
+            return o
+    d = configure(Decoder(), options)
+    # These depend on state crossing the CS# rising edges.
+    if d.changes_only:
+        return 'changes'
+    if d.options['packets'] == 'yes':
+        return 'packets'
+    if d.poll_regs:
+        return 'polls'
+    if d.timing_ms > 0:
+        return 'timing'
+    if d.delay_buckets is not None:
+        return 'delaybuckets'
+    return None
+
+def decode(path, channels, options = {}, jobs = None, parts = None,
+        unitsize = None, samplerate = None, window = WINDOW, output = None):
+    '''Decodes a capture (see open_capture()) like the Engine would, using
+    'jobs' processes and about 'parts' pieces. 'channels' are the keyword
+    arguments of SpiSampler. Records are passed to 'output' in sample
+    order, or returned as a list if 'output' is None.'''
+    o = unsupported(options)
+    if o is not None:
+        raise ValueError('The "{}" option is not supported'.format(o))
+    capture = open_capture(path, unitsize, samplerate)
+    jobs = jobs or os.cpu_count() or 1
+    parts = parts or jobs * 4
+    bounds = split(capture, channels['cs'], parts)
+
+    records = []
+    if output is None:
+        output = records.append
+    spi3pin = 1 if options.get('spi3pin', 'no') == 'yes' else 0
+
+    with ProcessPoolExecutor(jobs) as pool:
+        def submit(k, mode):
+            # Include the sample with the CS# rising edge ending the piece.
+            stop = min(bounds[k + 1] + 1, capture.length)
+            return pool.submit(decode_range, path, unitsize, samplerate, channels,
+                options, bounds[k], stop, mode, window)
+
+        futures = [submit(k, spi3pin) for k in range(len(bounds) - 1)]
+        mode = spi3pin
+        for k, f in enumerate(futures):
+            recs, end = f.result()
+            if mode != spi3pin:
+                # The previous piece ended in the other pin mode.
+                recs, end = submit(k, mode).result()
+            for r in recs:
+                output(r)
+            mode = end
+    return records
@@ -17,13 +17,144 @@
 ## You should have received a copy of the GNU General Public License
 ## along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-import sigrokdecode as srd
+try:
+    import sigrokdecode as srd
+except ImportError:
+    # Not running inside libsigrokdecode.
+    from . import offline as srd
+import bisect
+import functools
+import math
+import sys
+import weakref
 from .regdecode import *
 from .regs import *
+from .txlog import TransactionLog
+from .packets import PacketAssembler, packet_text
+from .instrument import Profiler
+from .channels import ChannelTimeline
+from .timing import TimingStats
 
 class ChannelError(Exception):
     pass
 
+def command_text(addr, dir_wr, inc, textdata = None):
+    '''Returns the label for a command, with the decoded value 'textdata'
+    if given.'''
+    reg = RegDecode.name(addr)
+    if reg is None:
+        reg = hex(addr)
+
+    multi = '_inc' if inc == 1 else ''
+
+    if dir_wr == 1:
+        if textdata is None:
+            return 'write{}({})'.format(multi, reg)
+        else:
+            return 'write{}({}, "{}")'.format(multi, reg, textdata)
+    else:
+        if textdata is None:
+            return 'read{}({})'.format(multi, reg)
+        else:
+            return 'read{}({}) == "{}"'.format(multi, reg, textdata)
+
+def run_hooks(hooks):
+    '''Runs and removes the callables in the list 'hooks'.'''
+    while hooks:
+        hooks.pop(0)()
+
+# Power of two delay buckets, see the delaybuckets option.
+DELAY_BUCKETS = 40
+
+def us_to_samples(us, samplerate, up = True):
+    '''Returns the number of samples in 'us' microseconds, rounded up (or
+    down), ignoring rounding errors of the float arithmetic.'''
+    n = us * samplerate / 1000000
+    return math.ceil(n - 1e-9) if up else math.floor(n + 1e-9)
+
+def delay_bucket_text(i):
+    '''Returns the range of the delay bucket 'i' in us.'''
+    if i == 0:
+        return '<1'
+    if i == DELAY_BUCKETS:
+        return '>={}'.format(1 << (i - 1))
+    return '{}..{}'.format(1 << (i - 1), 1 << i)
+
+@functools.lru_cache(maxsize = 4096)
+def render_command(addr, dir_wr, inc, data, chip = None):
+    '''Returns the label for a transaction with the payload 'data' (bytes,
+    or None to leave out the value), decoded for the chip type 'chip', and
+    the warning for the value or None. Results are memoized, most
+    transactions repeat.'''
+    if data is None:
+        return command_text(addr, dir_wr, inc), None
+    textdata, warn = RegDecode.decode_bytes(addr, data, chip)
+    return command_text(addr, dir_wr, inc, textdata), warn
+
+# Number of annotations kept by annotation_data().
+ANNOTATION_CACHE_SIZE = 4096
+
+@functools.lru_cache(maxsize = ANNOTATION_CACHE_SIZE)
+def annotation_data(addr, dir_wr, inc, data, chip = None):
+    '''Returns the annotation data ([class, [label]]) for a transaction
+    with the payload 'data' (see render_command()), and the one for the
+    warning or None. The same lists are returned for repeated transactions,
+    they must not be modified.'''
+    text, warn = render_command(addr, dir_wr, inc, data, chip)
+    ann = Decoder.ann_write if dir_wr == 1 else Decoder.ann_read
+    if warn is None:
+        return [ann, [text]], None
+    return [ann, [text]], [Decoder.ann_warn, [warn]]
+
+def annotation_cache_stats():
+    '''Returns the hits, misses, size and hit rate of the annotation_data()
+    cache as a dict.'''
+    info = annotation_data.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'hit_rate': info.hits / lookups if lookups else None,
+    }
+
+class Command():
+    '''A command byte, with everything needed for the data bytes following
+    it resolved ahead of time.'''
+
+    def __init__(self, addr, dir_wr, inc):
+        self.addr = addr
+        self.dir_wr = dir_wr # 1 = write, 0 = read
+        self.inc = inc # 1 = auto address increment, 0 = same address
+        # Number of data bytes, 0 for addresses without a register.
+        self.width = RegDecode.widths[addr] if addr < len(RegDecode.widths) else 0
+        # Binary output class of the payload, or None.
+        self.binary = None
+        if dir_wr == 1 and addr == RegDecode.addr('TX_BUFFER_ADR'):
+            self.binary = 0
+        elif dir_wr == 0 and addr == RegDecode.addr('RX_BUFFER_ADR'):
+            self.binary = 1
+        # Decoder method run after the transaction, or None.
+        self.action = Decoder.actions.get(addr)
+        # The Command for the next register, see Decoder.next().
+        self.next = self
+
+def build_commands():
+    '''Returns the Commands for all 256 command bytes. Auto incrementing
+    Commands are linked to the Command for the following address.'''
+    commands = [None] * 256
+    n = len(RegDecode.widths)
+    for dir_wr in (0, 1):
+        for inc in (0, 1):
+            # One more address for incrementing past the last register.
+            cmds = [Command(addr, dir_wr, inc) for addr in range(n + 1)]
+            if inc:
+                for c, c_next in zip(cmds, cmds[1:]):
+                    c.next = c_next
+            for addr in range(n):
+                commands[(dir_wr << 7) | (inc << 6) | addr] = cmds[addr]
+    return commands
+
 class Decoder(srd.Decoder):
     api_version = 2
     id = 'cyrf6936'
@@ -41,6 +172,8 @@ class Decoder(srd.Decoder):
         ('state', 'State change'),
         ('warning', 'Warnings'),
         ('wait', 'Wait'),
+        ('packet', 'Radio packet'),
+        ('timing', 'Timing statistics'),
     )
     ann_write = 0
     ann_read = 1
@@ -49,32 +182,112 @@ class Decoder(srd.Decoder):
     ann_state = 4
     ann_warn = 5
     ann_wait = 6
+    ann_packet = 7
+    ann_timing = 8
     annotation_rows = (
         ('cmd', 'Commands', (ann_write, ann_read, ann_tx, ann_rx)),
         ('warnings', 'Warnings', (ann_warn, ann_state)),
         ('delays', 'Delays', (ann_wait,)),
+        ('packets', 'Packets', (ann_packet,)),
+        ('timing', 'Timing', (ann_timing,)),
     )
     options = (
             {'id': 'spi3pin', 'desc': 'SPI 3-pin mode with MOSI/MISO combined as SDAT on the MOSI pin',
                 'default': 'no', 'values': ('no', 'yes')},
             {'id': 'delaysplit', 'desc': 'annotate delays (in us) larger than... (0 = off)', 'default': 0},
+            {'id': 'delaymax', 'desc': 'annotate delays (in us) only up to... (0 = no limit)', 'default': 0},
+            {'id': 'delaybuckets', 'desc': 'Annotate delays by power of two bucket (in us), with a histogram at the end',
+                'default': 'no', 'values': ('no', 'yes')},
             {'id': 'invert_mosi', 'desc': 'Invert MOSI', 'default': 'no', 'values': ('yes', 'no')},
             {'id': 'invert_miso', 'desc': 'Invert MISO', 'default': 'no', 'values': ('yes', 'no')},
+            {'id': 'chip', 'desc': 'Chip type', 'default': 'LP', 'values': ('LP', 'LPstar')},
+            {'id': 'changes', 'desc': 'Decode register values only when changed', 'default': 'no', 'values': ('no', 'yes')},
+            {'id': 'txlog', 'desc': 'Write a binary transaction log to this file', 'default': ''},
+            {'id': 'packets', 'desc': 'Annotate radio packets', 'default': 'no', 'values': ('no', 'yes')},
+            {'id': 'polls', 'desc': 'Collapse repeated IRQ status reads', 'default': 'no', 'values': ('no', 'yes')},
+            {'id': 'index', 'desc': 'Write an SQLite index of the transactions to this file', 'default': ''},
+            {'id': 'timeline', 'desc': 'Write the channel hops and their statistics as JSON to this file', 'default': ''},
+            {'id': 'timing', 'desc': 'Annotate percentiles of gaps, transaction durations and packet latencies every ... ms (0 = off)', 'default': 0},
+            {'id': 'timingreport', 'desc': 'Write percentiles of gaps, transaction durations and packet latencies as JSON to this file', 'default': ''},
+            {'id': 'profile', 'desc': 'Write decoder counters and timings as JSON to this file', 'default': ''},
     )
+    # Options naming files to write, instead of changing the annotations.
+    file_options = ('txlog', 'index', 'timeline', 'timingreport', 'profile')
+    # Commands by command byte, see build_commands().
+    commands = None
+    # State annotations for spi3pin = 0 and 1.
+    spi_modes = ('4-pin SPI mode (MOSI/MISO)', '3-pin SPI mode (SDAT)')
     binary = (
         ('txpayload', 'Transfer payload'),
         ('rxpayload', 'Receive payload'),
     )
 
     def __init__(self):
+        # Preallocated buffers for the bytes after the command byte,
+        # large enough for the widest register.
+        self.mb_mosi = bytearray(max(RegDecode.widths))
+        self.mb_miso = bytearray(max(RegDecode.widths))
         self.reset()
         self.spi3pin = 0 # 0 = 4-pin SPI with CLK, CSn, MOSI, MISO; 1 = 3-pin SPI with CLK, CSn, SDAT
         self.requirements_met = True
         self.cs_was_released = False
         self.samplerate = None
+        # Delay annotation limits, in us as set by the options and in
+        # samples as compared on every CS# edge (no delays are annotated
+        # until the samplerate is known).
         self.delaysplit = 0
+        self.delaymax = 0
+        self.delay_min = sys.maxsize
+        self.delay_max = sys.maxsize
+        # Lowest samples of the power of two delay buckets (1 us, 2 us,
+        # ...) if delays are annotated by bucket, and the number of
+        # annotated delays in each.
+        self.delay_buckets = None
+        self.delay_histogram = [0] * (DELAY_BUCKETS + 1)
         self.wait_s = 0
         self.wait_e = 0
+        self.invert = False
+        self.invert_mosi = 0
+        self.invert_miso = 0
+        self.changes_only = False
+        # Chip type the registers are decoded for, per instance.
+        self.chip = RegDecode.chip
+        # Shadow register file: last value written to or read from every
+        # single byte register (and whether there is one), and the last
+        # value of the multi byte registers by address.
+        self.shadow = bytearray(len(RegDecode.widths))
+        self.shadow_known = bytearray(len(RegDecode.widths))
+        self.shadow_files = {}
+        # Callables getting every transaction as (ss, es, addr, dir_wr,
+        # inc, data); 'data' is only valid during the call.
+        self.transaction_hooks = []
+        # Whether transactions are put as annotations and binary data.
+        self.annotate = True
+        # Whether transactions are annotated with (addr, dir_wr, inc,
+        # data, chip) tuples, to be rendered by render_command() on
+        # demand, instead of text. Only for the offline Engine.
+        self.lazy = False
+        self.txlog = None
+        self.index = None
+        self.timeline = None
+        self.packets = None
+        # TimingStats, and the summary period (in ms and in samples, 0 =
+        # no summaries) and the start of the current one.
+        self.timing = None
+        self.timing_ms = 0
+        self.timing_period = 0
+        self.timing_s = 0
+        # Registers whose repeated reads are collapsed, and the run of
+        # reads collected: [addr, value, ss, es, count].
+        self.poll_regs = ()
+        self.poll_run = None
+        self.profiler = None
+        if Decoder.commands is None:
+            Decoder.commands = build_commands()
+        # Callables run by end(), and the finalizer running them when
+        # the decoder is collected (libsigrokdecode only).
+        self.end_hooks = []
+        self.end_finalizer = None
 
     def start(self):
         self.out_ann = self.register(srd.OUTPUT_ANN)
@@ -85,10 +298,113 @@ class Decoder(srd.Decoder):
             self.delaysplit = float(self.options['delaysplit'])
         except ValueError:
             self.delaysplit = 0
+        try:
+            self.delaymax = float(self.options['delaymax'])
+        except ValueError:
+            self.delaymax = 0
+        if self.options['delaybuckets'] == 'yes':
+            self.delay_buckets = []
+            if getattr(srd, 'OFFLINE', False):
+                self.at_end(self.put_delay_histogram)
+        # XOR masks applied to every byte, resolved once here instead of
+        # looking at the options for every byte.
+        self.invert_mosi = 0xff if self.options['invert_mosi'] == 'yes' else 0
+        self.invert_miso = 0xff if self.options['invert_miso'] == 'yes' else 0
+        self.invert = (self.invert_mosi | self.invert_miso) != 0
+        self.changes_only = self.options['changes'] == 'yes'
+        self.chip = self.options['chip']
+        if self.options['txlog']:
+            self.txlog = TransactionLog(self.chip)
+            self.transaction_hooks.append(self.txlog.append)
+            self.at_end(functools.partial(self.txlog.save, self.options['txlog']))
+        if self.options['index']:
+            # Imported here, 'python -m cyrf6936.index' warns if
+            # importing the package already loaded the module.
+            from .index import TransactionIndex
+            self.index = TransactionIndex.create(self.options['index'], chip = self.chip)
+            self.transaction_hooks.append(self.index.add)
+            self.at_end(self.index.close)
+        if self.options['timeline']:
+            self.timeline = ChannelTimeline()
+            self.transaction_hooks.append(self.timeline.transaction)
+            self.at_end(functools.partial(self.timeline.save, self.options['timeline']))
+        try:
+            self.timing_ms = float(self.options['timing'])
+        except ValueError:
+            self.timing_ms = 0
+        if self.timing_ms > 0 or self.options['timingreport']:
+            self.timing = TimingStats()
+            self.transaction_hooks.append(self.timing.transaction)
+        if self.options['packets'] == 'yes' or self.timing is not None:
+            # The packet latencies need packets, annotated or not.
+            if self.options['packets'] == 'yes':
+                self.packets = PacketAssembler(self.put_packet)
+            else:
+                self.packets = PacketAssembler(self.timing.packet)
+            self.transaction_hooks.append(self.packets.transaction)
+            if getattr(srd, 'OFFLINE', False):
+                # Nothing can be put at exit in libsigrokdecode, a packet
+                # still waiting for its last transaction is lost there.
+                self.at_end(self.packets.flush)
+        if self.timing is not None:
+            # After flushing the packets, so that the last summary and the
+            # report include the latency of a packet still open.
+            if self.timing_ms > 0 and getattr(srd, 'OFFLINE', False):
+                self.at_end(self.put_timing)
+            if self.options['timingreport']:
+                self.at_end(functools.partial(self.timing.save, self.options['timingreport']))
+        if self.options['polls'] == 'yes':
+            self.poll_regs = (0x04, 0x07) # TX_IRQ_STATUS_ADR, RX_IRQ_STATUS_ADR
+            if getattr(srd, 'OFFLINE', False):
+                self.at_end(self.end_poll)
+        if self.options['profile']:
+            # Instruments this instance only, so it costs nothing unless
+            # enabled.
+            self.profiler = Profiler(self)
+            self.profiler.install()
+            self.at_end(functools.partial(self.profiler.save, self.options['profile']))
+        self.convert_times()
+
+    def at_end(self, f):
+        '''Runs 'f' at the end of the stream.
+
+        libsigrokdecode versions without an end of stream callback never
+        call end(); there 'f' runs when the decoder is collected, or at
+        exit if it is still alive then. So 'f' must not refer to the
+        decoder, or it would keep it alive until exit.'''
+        self.end_hooks.append(f)
+        if self.end_finalizer is None and not getattr(srd, 'OFFLINE', False):
+            self.end_finalizer = weakref.finalize(self, run_hooks, self.end_hooks)
+
+    def end(self):
+        '''Called at the end of the stream, by the offline Engine or by
+        libsigrokdecode versions calling end().'''
+        run_hooks(self.end_hooks)
 
     def metadata(self, key, value):
         if key == srd.SRD_CONF_SAMPLERATE:
             self.samplerate = value
+            self.convert_times()
+
+    def convert_times(self):
+        '''Converts the times set by the options to samples, once the
+        samplerate is known, so that CS# edges are handled in samples.'''
+        if not self.samplerate:
+            return
+        # For the reports written at the end of the stream.
+        if self.timeline is not None:
+            self.timeline.samplerate = self.samplerate
+        if self.timing is not None:
+            self.timing.samplerate = self.samplerate
+        if self.timing_ms > 0:
+            self.timing_period = max(1, int(self.timing_ms * self.samplerate / 1000))
+        if self.delaysplit > 0 or self.delay_buckets is not None:
+            # Bucket mode annotates all delays unless limited.
+            self.delay_min = max(1, us_to_samples(self.delaysplit, self.samplerate))
+            if self.delaymax > 0:
+                self.delay_max = us_to_samples(self.delaymax, self.samplerate, up = False)
+        if self.delay_buckets is not None:
+            self.delay_buckets = [us_to_samples(1 << i, self.samplerate) for i in range(DELAY_BUCKETS)]
 
     def warn(self, pos, msg):
         '''Put a warning message 'msg' at 'pos'.'''
@@ -98,6 +414,12 @@ class Decoder(srd.Decoder):
         '''Put an annotation message 'msg' at 'pos'.'''
         self.put(pos[0], pos[1], self.out_ann, [ann, [msg]])
 
+    def put_packet(self, packet):
+        '''Put the annotation for a radio packet, see PacketAssembler.'''
+        if self.timing is not None:
+            self.timing.packet(packet)
+        self.putp((packet[1], packet[2]), self.ann_packet, packet_text(packet, self.samplerate))
+
     def putb(self, pos, data):
         self.put(pos[0], pos[1], self.out_binary, data)
 
@@ -108,15 +430,16 @@ class Decoder(srd.Decoder):
 
         # The current command, and the minimum and maximum number
         # of data bytes to follow.
+        self.cmd = None
         self.addr = None
         self.dir_wr = 1 # Command direction: 1 = write, 0 = read
         self.inc = 0 # Command increment: 1 = auto address increment, 0 = same address
         self.min = 0
         self.max = 0
 
-        # Used to collect the bytes after the command byte
-        # (and the start/end sample number).
-        self.mb = []
+        # Number of bytes collected in mb_mosi/mb_miso after the
+        # command byte (and the start/end sample number).
+        self.mb_len = 0
         self.mb_s = -1
         self.mb_e = -1
 
@@ -125,23 +448,49 @@ class Decoder(srd.Decoder):
         # The current command, and the minimum and maximum number
         # of data bytes to follow.
         if self.inc:
-            self.addr += 1
+            cmd = self.cmd = self.cmd.next
+            self.addr = cmd.addr
+            self.max = cmd.width
         self.min = 0
-        self.max = 0
 
-        # Used to collect the bytes after the command byte
-        # (and the start/end sample number).
-        self.mb = []
+        # Number of bytes collected in mb_mosi/mb_miso after the
+        # command byte (and the start/end sample number).
+        self.mb_len = 0
         self.mb_s = -1
         self.mb_e = -1
 
-    def mosi_bytes(self):
-        '''Returns the collected MOSI bytes of a multi byte command.'''
-        return [b[0] for b in self.mb]
-
-    def miso_bytes(self):
-        '''Returns the collected MISO bytes of a multi byte command.'''
-        return [b[1] for b in self.mb]
+    def payload(self, buf):
+        '''Returns the collected bytes in 'buf', padded with zeros to the
+        register width.'''
+        w = self.max
+        if self.mb_len < w:
+            buf[self.mb_len:w] = bytes(w - self.mb_len)
+        # libsigrokdecode only accepts bytes objects, so this is the
+        # one copy of the payload.
+        return bytes(memoryview(buf)[:w])
+
+    def update_shadow(self, addr, data):
+        '''Updates the shadow register file with the value 'data' of the
+        register 'addr'. Returns True if the value changed.'''
+        if addr < len(self.shadow) and RegDecode.widths[addr] == 1:
+            v = data[0]
+            if self.shadow_known[addr] and self.shadow[addr] == v:
+                return False
+            self.shadow[addr] = v
+            self.shadow_known[addr] = 1
+            return True
+        v = bytes(data)
+        if self.shadow_files.get(addr) == v:
+            return False
+        self.shadow_files[addr] = v
+        return True
+
+    def shadow_value(self, addr):
+        '''Returns the last known value of the register 'addr' (an int for
+        single byte registers, bytes otherwise) or None.'''
+        if addr < len(self.shadow) and RegDecode.widths[addr] == 1:
+            return self.shadow[addr] if self.shadow_known[addr] else None
+        return self.shadow_files.get(addr)
 
     def decode_command(self, pos, b):
         '''Decodes the command byte 'b' at position 'pos' and prepares
@@ -156,25 +505,6 @@ class Decoder(srd.Decoder):
 
         self.mb_s = pos[0]
 
-    def format_command(self, textdata = None):
-        '''Returns the label for the current command.'''
-        reg = RegDecode.name(self.addr)
-        if reg is None:
-            reg = hex(self.addr)
-
-        multi = '_inc' if self.inc == 1 else ''
-
-        if self.dir_wr == 1:
-            if textdata is None:
-                return 'write{}({})'.format(multi, reg)
-            else:
-                return 'write{}({}, "{}")'.format(multi, reg, textdata)
-        else:
-            if textdata is None:
-                return 'read{}({})'.format(multi, reg)
-            else:
-                return 'read{}({}) == "{}"'.format(multi, reg, textdata)
-
     def parse_command(self, b):
         '''Parses the command byte.
 
@@ -211,38 +541,136 @@ class Decoder(srd.Decoder):
     def finish_command(self, pos):
         '''Decodes the remaining data bytes at position 'pos'.'''
 
-        def slipad(data, w, p = 0):
-            d = w - len(data)
-            if d < 0:
-                d = 0
-            return data[0:w] + [ p for i in range(0,d)]
-
         if self.dir_wr == 1:
-            data = self.mosi_bytes()
-            if RegDecode.name(self.addr) == 'TX_BUFFER_ADR':
-                # slice/pad data to the register width
-                bindata = slipad(data, RegDecode.width(self.addr))
-                self.putb(pos, [0, bytes(bindata)])
-        else:
-            data = self.miso_bytes() if (self.spi3pin == 0) else self.mosi_bytes()
-            if RegDecode.name(self.addr) == 'RX_BUFFER_ADR':
-                # slice/pad data to the register width
-                bindata = slipad(data, RegDecode.width(self.addr))
-                self.putb(pos, [1, bytes(bindata)])
-
-        decoded = RegDecode.decode(self.addr, data)
-        if type(decoded) == tuple:
-            textdata, warn = decoded
-            if warn == '':
-                warn = None
+            buf = self.mb_mosi
         else:
-            textdata = decoded
-            warn = None
+            buf = self.mb_miso if (self.spi3pin == 0) else self.mb_mosi
+        data = memoryview(buf)[:self.mb_len]
+
+        for hook in self.transaction_hooks:
+            hook(pos[0], pos[1], self.addr, self.dir_wr, self.inc, data)
+        changed = self.update_shadow(self.addr, data)
+        if not self.annotate:
+            return
+
+        binary = self.cmd.binary
+        if binary is not None:
+            self.putb(pos, [binary, self.payload(buf)])
+
+        value = bytes(data)
+        if self.addr in self.poll_regs and self.dir_wr == 0 and self.inc == 0:
+            self.poll(pos, value)
+            return
+        if self.poll_run is not None:
+            self.end_poll()
+
+        if not changed and self.changes_only:
+            # Unchanged value, skip decoding it.
+            value = None
+        self.put_command(pos, self.addr, self.dir_wr, self.inc, value)
+
+    def put_command(self, pos, addr, dir_wr, inc, value):
+        '''Put the annotation for a transaction with the payload 'value'
+        (see render_command()) at 'pos'.'''
+        if self.lazy:
+            ann = self.ann_write if (dir_wr == 1) else self.ann_read
+            self.putp(pos, ann, (addr, dir_wr, inc, value, self.chip))
+            return
+
+        ann_data, warn_data = annotation_data(addr, dir_wr, inc, value, self.chip)
+        self.put(pos[0], pos[1], self.out_ann, ann_data)
+        if not warn_data is None:
+            self.put(pos[0], pos[1], self.out_ann, warn_data)
+
+    def poll(self, pos, value):
+        '''Collects a read of the value 'value' of an IRQ status register
+        at 'pos'. A run of identical reads is put as one annotation when
+        another transaction follows.'''
+        run = self.poll_run
+        if run is not None:
+            if run[0] == self.addr and run[1] == value:
+                run[3] = pos[1]
+                run[4] += 1
+                return
+            if run[0] == self.addr and run[4] > 1:
+                # The run ends with this read.
+                self.end_poll(pos[1], value)
+                return
+            self.end_poll()
+        self.poll_run = [self.addr, value, pos[0], pos[1], 1]
+
+    def end_poll(self, es = None, until = None):
+        '''Puts the annotation for the collected run of reads, optionally
+        ended by a read of the value 'until' ending at 'es'.'''
+        run = self.poll_run
+        if run is None:
+            return
+        self.poll_run = None
+        addr, value, ss, run_es, count = run
+        if count == 1:
+            self.put_command((ss, run_es), addr, 0, 0, value)
+            return
 
-        self.putp(pos, self.ann_write if (self.dir_wr == 1) else self.ann_read, self.format_command(textdata))
+        pos = (ss, run_es if es is None else es)
+        text, warn = render_command(addr, 0, 0, value, self.chip)
+        if self.samplerate:
+            duration = '{:.2f} us'.format((pos[1] - pos[0]) * 1000000 / self.samplerate)
+        else:
+            duration = '{} samples'.format(pos[1] - pos[0])
+        text = '{} polled {} times over {}'.format(text, count, duration)
+        if until is not None:
+            until_text, until_warn = RegDecode.decode_bytes(addr, until, self.chip)
+            text = '{} until "{}"'.format(text, until_text)
+        self.putp(pos, self.ann_read, text)
         if not warn is None:
             self.warn(pos, warn)
+        if until is not None and not until_warn is None:
+            self.warn(pos, until_warn)
+
+    def put_delay(self, ss, es):
+        '''Puts the annotation for the CS# gap from 'ss' to 'es'.'''
+        if self.delay_buckets is None:
+            dt = ((es - ss) * 1000000) / self.samplerate
+            self.putp((ss, es), self.ann_wait, 'delay_us({})'.format(dt))
+            return
+        i = bisect.bisect_right(self.delay_buckets, es - ss)
+        self.delay_histogram[i] += 1
+        self.putp((ss, es), self.ann_wait, 'delay_us({})'.format(delay_bucket_text(i)))
+
+    def put_delay_histogram(self):
+        '''Puts the number of annotated delays by bucket, up to the last
+        CS# edge.'''
+        counts = ['{} us: {}'.format(delay_bucket_text(i), n) for i, n in enumerate(self.delay_histogram) if n]
+        if counts:
+            self.putp((0, max(self.wait_s, self.wait_e)), self.ann_wait,
+                'delay_histogram({})'.format(', '.join(counts)))
+
+    def put_timing(self, es = None):
+        '''Puts the summary of the timing statistics collected since the
+        last one, up to 'es' (the end of the last transaction if None).'''
+        window = self.timing.roll()
+        if es is None:
+            es = max(self.wait_s, self.timing_s)
+        if window:
+            self.putp((self.timing_s, es), self.ann_timing, self.timing.summary(window, self.samplerate))
+        self.timing_s = es
+
+    def io_cfg(self, ss, es, mosi, miso):
+        '''Switches between 3-pin and 4-pin SPI after an IO_CFG_ADR
+        transaction with the last byte 'mosi'/'miso' at 'ss' to 'es'.'''
+        if (self.dir_wr == 0) and (self.spi3pin == 0):
+            b = miso
+        else:
+            b = mosi
+        spi3pin = (b >> 1) & 1 # SPI_3PIN
+        if spi3pin != self.spi3pin:
+            self.spi3pin = spi3pin
+            self.put(ss, es, self.out_ann, [self.ann_state, [self.spi_modes[spi3pin]]])
 
+    # Methods run after a transaction, by register address.
+    actions = {
+        0x0d: io_cfg, # IO_CFG_ADR
+    }
 
     def decode(self, ss, es, data):
         if not self.requirements_met:
@@ -264,10 +692,10 @@ class Decoder(srd.Decoder):
                 if self.addr:
                     # Check if we got the minimum number of data bytes
                     # after the command byte.
-                    if len(self.mb) < self.min:
+                    if self.mb_len < self.min:
                         self.warn((ss, ss), 'missing data bytes')
 
-                    if (self.mb_s != -1) and len(self.mb) > 0:
+                    if (self.mb_s != -1) and self.mb_len > 0:
                         self.finish_command((self.mb_s, self.mb_e))
                 self.wait_s = es
 
@@ -277,68 +705,63 @@ class Decoder(srd.Decoder):
             if data1 == 1 and data2 == 0:
                 # Falling edge of CS# / start of pause
                 self.wait_e = ss
-                if (self.delaysplit > 0) and (self.wait_e > self.wait_s):
-                    dt = ((self.wait_e - self.wait_s) *1000000)/ self.samplerate
-                    if (dt >= self.delaysplit):
-                        self.putp((self.wait_s, self.wait_e), self.ann_wait, "delay_us({})".format(dt))
+                if self.delay_min <= ss - self.wait_s <= self.delay_max:
+                    self.put_delay(self.wait_s, ss)
+                if self.timing is not None:
+                    if self.wait_e > self.wait_s:
+                        self.timing.gap(self.wait_s, self.wait_e)
+                    if self.timing_period and self.wait_e - self.timing_s >= self.timing_period:
+                        self.put_timing(self.wait_e)
 
         elif ptype == 'DATA' and self.cs_was_released:
             mosi, miso = data1, data2
-            pos = (ss, es)
 
             if mosi is None:
                 self.requirements_met = False
                 raise ChannelError('A MOSI/SDAT pin is required.')
 
-            if self.options['invert_mosi'] == 'yes':
-                mosi = not mosi
-            if self.options['invert_miso'] == 'yes':
-                miso = not miso
+            if self.invert:
+                mosi ^= self.invert_mosi
+                if miso is not None:
+                    miso ^= self.invert_miso
 
             if self.first:
                 self.first = False
                 # First MOSI byte is always the command.
-                self.addr, self.dir_wr, self.inc = self.parse_command(mosi)
-                self.mb_s = pos[0]
+                cmd = self.cmd = self.commands[mosi]
+                self.addr = cmd.addr
+                self.dir_wr = cmd.dir_wr
+                self.inc = cmd.inc
+                self.max = cmd.width
+                self.mb_s = ss
 
                 # First MISO byte is discarded
                 if ((miso is not None) and not ((miso == 0xff) or (miso == 0x00))):
-                    self.warn(pos, 'unrequested data {}'.format(miso))
-            else:
-                if RegDecode.valid(self.addr):
-                    self.max = RegDecode.width(self.addr)
-                else:
-                    self.max = 0
-
-                if (len(self.mb) > self.max):
-                        self.warn(pos, 'excess byte')
-                elif ((miso is None) and (self.spi3pin == 0)):
-                    self.requirements_met = False
-                    raise ChannelError('A MISO pin is required in 4-pin SPI mode.')
-                else:
-                    # Collect the bytes after the command byte.
-                    if self.mb_s == -1:
-                        self.mb_s = ss
-                    self.mb_e = es
-                    self.mb.append((mosi, miso))
-                    if (len(self.mb) >= self.max):
-                        self.finish_command((self.mb_s, self.mb_e))
-                        self.next()
-
-                    if self.addr == 0x0d: # IO_CFG_ADDR
-                        old_spi3pin = self.spi3pin
-                        if (self.dir_wr == 0) and (self.spi3pin == 0):
-                            b = miso
-                        else:
-                            b = mosi
-                        if ((b & 0x02) == 0x02):
-                            self.spi3pin = 1
-                            msg = "3-pin SPI mode (SDAT)"
-                        else:
-                            self.spi3pin = 0
-                            msg = "4-pin SPI mode (MOSI/MISO)"
-                        if self.spi3pin != old_spi3pin:
-                            self.put(ss, es, self.out_ann, [self.ann_status, [msg]])
-
-                    if self.inc:
-                        self.next()
+                    self.warn((ss, es), 'unrequested data {}'.format(miso))
+                return
+
+            n = self.mb_len
+            if (n > self.max):
+                self.warn((ss, es), 'excess byte')
+                return
+            if ((miso is None) and (self.spi3pin == 0)):
+                self.requirements_met = False
+                raise ChannelError('A MISO pin is required in 4-pin SPI mode.')
+
+            # Collect the bytes after the command byte.
+            if self.mb_s == -1:
+                self.mb_s = ss
+            self.mb_e = es
+            self.mb_mosi[n] = mosi
+            self.mb_miso[n] = miso if miso is not None else 0
+            n += 1
+            self.mb_len = n
+
+            if (n >= self.max):
+                self.finish_command((self.mb_s, self.mb_e))
+
+                action = self.cmd.action
+                if action is not None:
+                    action(self, ss, es, mosi, miso)
+
+                self.next()
@@ -14,20 +14,130 @@
 ## You should have received a copy of the GNU General Public License
 ## along with this program. If not, see <http://www.gnu.org/licenses/>.
 
+class Flag():
+    '''A single bit 'bit', shown as 'name' if set and as 'clear' if cleared.
+    If the bit is set, the warning 'warn' is issued (only for the chip
+    type 'chip', if given).'''
+    def __init__(self, bit, name = None, clear = None, warn = None, chip = None):
+        self.mask = 1 << bit
+        self.name = name
+        self.clear = clear
+        self.warn = warn
+        self.chip = chip
+
+    def compile(self, chip):
+        mask, name, clear = self.mask, self.name, self.clear
+        warn = self.warn if self.chip in (None, chip) else None
+        def field(v):
+            if v & mask:
+                return name, warn
+            return clear, None
+        return field
+
+class Enum():
+    '''A bit field 'mask' (not shifted) with the named settings 'values'.
+    Undefined settings are shown as 'default' and warned about as 'warn',
+    both being format strings for the masked value.'''
+    def __init__(self, mask, values, default = None, warn = None):
+        self.mask = mask
+        self.values = values
+        self.default = default
+        self.warn = warn
+
+    def compile(self, chip):
+        mask, values, default, warn = self.mask, self.values, self.default, self.warn
+        def field(v):
+            f = v & mask
+            if f in values:
+                return values[f], None
+            return (None if default is None else default.format(f),
+                    None if warn is None else warn.format(f))
+        return field
+
+class Value():
+    '''A numerical bit field 'mask', shifted right by 'shift' and shown
+    using the format string 'fmt'.'''
+    def __init__(self, mask, fmt, shift = 0):
+        self.mask = mask
+        self.fmt = fmt
+        self.shift = shift
+
+    def compile(self, chip):
+        mask, fmt, shift = self.mask, self.fmt, self.shift
+        def field(v):
+            return fmt.format((v & mask) >> shift), None
+        return field
+
+class Warn():
+    '''Issues the warning 'msg' if 'predicate' is true for the register
+    value (only for the chip type 'chip', if given).'''
+    def __init__(self, predicate, msg, chip = None):
+        self.predicate = predicate
+        self.msg = msg
+        self.chip = chip
+
+    def compile(self, chip):
+        if self.chip not in (None, chip):
+            return None
+        predicate, msg = self.predicate, self.msg
+        def field(v):
+            return None, msg if predicate(v) else None
+        return field
+
+class Bitfield():
+    '''Declarative description of a single byte register, made of Flag,
+    Enum, Value and Warn fields in display order.'''
+    def __init__(self, *fields):
+        self.fields = fields
+
+    def compile(self, chip):
+        '''Returns a decoder function for the chip type 'chip'.'''
+        fields = [f.compile(chip) for f in self.fields]
+        fields = tuple(f for f in fields if f is not None)
+        def decoder(v):
+            bf = []
+            warn = []
+            for field in fields:
+                text, w = field(v)
+                if text is not None:
+                    bf.append(text)
+                if w is not None:
+                    warn.append(w)
+            w = ""
+            if len(warn) > 0:
+                w = "Warn: "
+                w += '; '.join(warn)
+            return ' | '.join(bf), w
+        return decoder
+
 class RegDecode():
     regs = {}
     regnames = {}
+    widths = [0] * 64
     decoderfuncs = {}
+    schemas = {}
+    # Per chip type: decoder functions compiled from the schemas and
+    # lookup tables, by address.
+    compiled = {}
+    tables = {}
+    # Chip type used if none is given.
+    chip = 'LP'
 
-    def __init__(self, regs = {}):
+    def __init__(self, regs = {}, schemas = {}):
         RegDecode.defs(regs)
+        for r, s in schemas.items():
+            RegDecode.add_schema(r, s)
 
     def defs(regs):
         RegDecode.regs = regs
         regnames = {}
-        for reg, name in RegDecode.regs.items():
+        widths = [0] * max([64] + [reg + 1 for reg in regs])
+        for reg, (name, width) in RegDecode.regs.items():
             regnames[name] = reg
+            widths[reg] = width
         RegDecode.regnames = regnames
+        # Register widths by address, 0 for unknown registers.
+        RegDecode.widths = widths
 
     def name(r):
         if r in RegDecode.regs:
@@ -40,7 +150,7 @@ class RegDecode():
     def addr(r):
         try:
             r = int(r, 0)
-        except TypeError:
+        except (TypeError, ValueError):
             pass
         if r in RegDecode.regs:
             return r
@@ -50,11 +160,7 @@ class RegDecode():
             return None # raise AttributeError('No such register "{}"'.format(r))
 
     def valid(r):
-        try:
-            RegDecode.addr(r)
-        except AttributeError:
-            return False
-        return True
+        return RegDecode.addr(r) is not None
 
     def width(r):
         try:
@@ -70,6 +176,8 @@ class RegDecode():
         prefix = ''
         if type(data) == int:
             data = [data]
+        elif always_hex and isinstance(data, (bytes, bytearray, memoryview)):
+            return '0x' + data.hex().upper()
         if always_hex:
             prefix = '0x'
             def escape(b):
@@ -85,10 +193,122 @@ class RegDecode():
         except (TypeError, ValueError):
             return str(data)
 
+    def forget(r):
+        '''Drops the compiled functions and tables of register 'r'.'''
+        for c in RegDecode.compiled.values():
+            c.pop(r, None)
+        for t in RegDecode.tables.values():
+            t.pop(r, None)
+
     def add_decoderfunc(r, f):
-        RegDecode.decoderfuncs[RegDecode.addr(r)] = f
+        r = RegDecode.addr(r)
+        RegDecode.decoderfuncs[r] = f
+        RegDecode.schemas.pop(r, None)
+        RegDecode.forget(r)
+
+    def add_schema(r, s):
+        '''Adds the Bitfield description 's' of register 'r'.'''
+        r = RegDecode.addr(r)
+        RegDecode.schemas[r] = s
+        RegDecode.decoderfuncs.pop(r, None)
+        RegDecode.forget(r)
 
-    def decode(r, val):
+    def set_chip(chip):
+        '''Selects the chip type ('LP' or 'LPstar') the registers are decoded
+        for when no chip type is given.'''
+        RegDecode.chip = chip
+
+    def decoderfunc(r, chip = None):
+        '''Returns the decoder function of register 'r' for the chip type
+        'chip', or None.'''
+        s = RegDecode.schemas.get(r)
+        if s is None:
+            return RegDecode.decoderfuncs.get(r)
+        compiled = RegDecode.compiled.setdefault(chip or RegDecode.chip, {})
+        try:
+            return compiled[r]
+        except KeyError:
+            f = compiled[r] = s.compile(chip or RegDecode.chip)
+            return f
+
+    def normalize(ret):
+        '''Converts the return value of a decoder function to a tuple
+        (text, warning), with warning being None if there is none.'''
+        if type(ret) == tuple:
+            text, warn = ret
+            if warn == '':
+                warn = None
+            return text, warn
+        elif type(ret) == int:
+            return RegDecode.to_str(ret), None
+        else:
+            return ret, None
+
+    def build_table(r, chip = None):
+        '''Decodes all 256 values of the single byte register 'r' for the
+        chip type 'chip'.'''
+        f = RegDecode.decoderfunc(r, chip)
+        if f is None:
+            return tuple((RegDecode.to_str(v), None) for v in range(256))
+        return tuple(RegDecode.normalize(f(v)) for v in range(256))
+
+    def table(r, chip = None):
+        '''Returns the lookup table of the single byte register 'r' for the
+        chip type 'chip', mapping every byte value to its decoded (text,
+        warning) tuple. The table is built on first use.'''
+        tables = RegDecode.tables.setdefault(chip or RegDecode.chip, {})
+        try:
+            return tables[r]
+        except KeyError:
+            pass
+        if RegDecode.regs[r][1] != 1:
+            raise AttributeError('Register "{}" is not a single byte register'.format(r))
+        t = tables[r] = RegDecode.build_table(r, chip)
+        return t
+
+    def check_tables(path, chip = 'LP'):
+        '''Compares the decoded values of the single byte registers against
+        the expected output in the file 'path' (lines of address, value,
+        text and warning, separated by tabs), as written by the original
+        decoder for the chip type 'chip'. Returns a list of (register,
+        value, expected, decoded) tuples which differ.'''
+        mismatches = []
+        with open(path) as f:
+            for line in f:
+                r, v, text, warn = line.rstrip('\n').split('\t')
+                r, v = int(r, 0), int(v, 0)
+                expected = (text, warn or None)
+                decoded = RegDecode.decode_int(r, v, chip)
+                if decoded != expected:
+                    mismatches.append((r, v, expected, decoded))
+        return mismatches
+
+    def decode_int(r, v, chip = None):
+        '''Fast path of decode() for the integer address 'r' and the
+        integer value 'v'. Returns a tuple (text, warning).'''
+        try:
+            return RegDecode.tables[chip or RegDecode.chip][r][v]
+        except KeyError:
+            pass
+        if (r in RegDecode.regs) and (RegDecode.regs[r][1] == 1):
+            return RegDecode.table(r, chip)[v]
+        return RegDecode.to_str(v), None
+
+    def decode_bytes(r, data, chip = None):
+        '''Fast path of decode() for the integer address 'r' and the
+        data bytes 'data'. Returns a tuple (text, warning).'''
+        if len(data) == 1:
+            return RegDecode.decode_int(r, data[0], chip)
+        f = RegDecode.decoderfunc(r, chip)
+        if f is not None:
+            return RegDecode.normalize(f(list(data)))
+        return RegDecode.to_str(data), None
+
+    def decode(r, val, chip = None):
+        '''Decodes the value 'val' of register 'r', both given as numbers,
+        strings or (value only) lists of bytes, for the chip type 'chip'
+        (see set_chip() if None). Returns a tuple (text, warning).'''
+        a = RegDecode.addr(r)
         if (type(val) == list) and (len(val) == 1):
             val = val[0]
         try:
@@ -98,14 +318,11 @@ class RegDecode():
         else:
             if val.bit_length() > (RegDecode.width(r) * 8):
                 raise TypeError('Value {} exceeds register width {} of register {}'.format(val, RegDecode.width(r), r))
-        if RegDecode.valid(r) and (r in RegDecode.decoderfuncs):
-            ret = RegDecode.decoderfuncs[r](val)
-            if type(ret) == int:
-                return RegDecode.to_str(ret)
-            else:
-                return ret
-        else:
-            return RegDecode.to_str(val)
+        if a is None:
+            return RegDecode.to_str(val), None
+        if type(val) == int:
+            return RegDecode.decode_int(a, val, chip)
+        return RegDecode.decode_bytes(a, val, chip)
 
 class RDecode(RegDecode):
     def __init__(self, f):
@@ -16,7 +16,7 @@
 
 try:
     from .regdecode import *
-except SystemError:
+except (SystemError, ImportError):
     import sys
     sys.path.append('./')
     from regdecode import *
@@ -72,7 +72,161 @@ regs = {
     0x25: ('MFG_ID_ADR',            6)
 }
 
-RegDecode(regs)
+
+def flags(*names):
+    '''Returns Flag fields for the bit names 'names', MSB first.
+    None skips a bit.'''
+    n = len(names)
+    return [Flag(n - 1 - i, name) for i, name in enumerate(names) if name is not None]
+
+schemas = {
+    0x02: Bitfield(*flags("TX_GO", "TX_CLR", "TXB15_IRQEN", "TXB8_IRQEN",
+        "TXB0_IRQEN", "TXBERR_IRQEN", "TXC_IRQEN", "TXE_IRQEN")),
+    0x03: Bitfield(
+        Flag(5, "DATCODE_LEN_64", clear = "DATCODE_LEN_32"),
+        Enum(0x18, {0x00: "DATMODE_1MBPS", 0x08: "DATMODE_8DR",
+            0x10: "DATMODE_DDR", 0x18: "DATMODE_SDR"}),
+        Warn(lambda v: (v & 0x18) == 0x10, "DATMODE_DDR not supported on LPStar", chip = "LPstar"),
+        Warn(lambda v: (v & 0x18) == 0x18, "DATMODE_SDR not supported on LPStar", chip = "LPstar"),
+        Enum(0x07, {0x00: "PA_N30_DBM", 0x01: "PA_N25_DBM", 0x02: "PA_N20_DBM",
+            0x03: "PA_N15_DBM", 0x04: "PA_N10_DBM", 0x05: "PA_N5_DBM",
+            0x06: "PA_0_DBM", 0x07: "PA_4_DBM"}),
+    ),
+    0x04: Bitfield(*flags("XS_IRQ", "LV_IRQ", "TXB15_IRQ", "TXB8_IRQ",
+        "TXB0_IRQ", "TXBERR_IRQ", "TXC_IRQ", "TXE_IRQ")),
+    0x05: Bitfield(
+        Flag(7, "RX_GO"),
+        Flag(6, warn = "RSVD bit #6 not 0"),
+        *flags("RXB16_IRQEN", "RXB8_IRQEN", "RXB1_IRQEN", "RXBERR_IRQEN",
+            "RXC_IRQEN", "RXE_IRQEN"),
+    ),
+    0x06: Bitfield(
+        *flags("AUTO_AGC_EN", "LNA_EN", "ATT_EN", None, None, None, None, None),
+        Flag(4, "HI", clear = "LO"),
+        *flags("FASTTURN_EN", None, "RXOW_EN", "VLD_EN"),
+    ),
+    0x07: Bitfield(*flags("RXOW_IRQ", "SOFTDET_IRQ", "RXB16_IRQ", "RXB8_IRQ",
+        "RXB1_IRQ", "RXBERR_IRQ", "RXC_IRQ", "RXE_IRQ")),
+    0x08: Bitfield(
+        *flags("RX_ACK", "RX_PKTERR", "RX_EOPERR", "RX_CRC0", "RX_BAD_CRC", None, None, None),
+        Flag(2, "DATCODE_LEN_64", clear = "DATCODE_LEN_32"),
+        Enum(0x03, {0b00: "DATMODE_1MBPS", 0b01: "DATMODE_8DR",
+            0b10: "DATMODE_DDR", 0b11: "0b11"}),
+        Warn(lambda v: (v & 0x03) == 0x03, "Receive Data Mode 0b11 not valid"),
+    ),
+    0x0B: Bitfield(
+        *flags("PMU_EN", "LV_IRQ_EN", "PMU_MODE_FORCE", "PFET_OFF", None, None, None, None),
+        Enum(0x0C, {0x0C: "LV_IRQ_TH_1P8_V", 0x08: "LV_IRQ_TH_2P0_V",
+            0x04: "LV_IRQ_TH_2P2_V", 0x00: "LV_IRQ_TH_PMU_OUTV"}),
+        Enum(0x03, {0x03: "PMU_OUTV_2P4", 0x02: "PMU_OUTV_2P5",
+            0x01: "PMU_OUTV_2P6", 0x00: "PMU_OUTV_2P7"}),
+        Warn(lambda v: v != 0b00010000,
+            "The firmware should set 0b00010000 to this register while initiating", chip = "LPstar"),
+    ),
+    0x0C: Bitfield(
+        Enum(0xC0, {0x00: "XOUT_FNC_XOUT_FREQ", 0x40: "XOUT_FNC_PA_N",
+            0x80: "XOUT_FNC_RAD_STREAM", 0xC0: "XOUT_FNC_GPIO"}),
+        Flag(5, "XS_IRQ_EN"),
+        Enum(0x07, {0x00: "XOUT_FREQ_12MHZ", 0x01: "XOUT_FREQ_6MHZ",
+            0x02: "XOUT_FREQ_3MHZ", 0x03: "XOUT_FREQ_1P5MHZ", 0x04: "XOUT_FREQ_P75MHZ"},
+            default = "0b{0:b}", warn = "Frequency setting 0b{0:b} not defined"),
+    ),
+    0x0D: Bitfield(
+        *flags("IRQ_OD", "IRQ_POL", "MISO_OD", "XOUT_OD", None, None, None, None),
+        Flag(3, "PACTL_OD", warn = "For LPstar bit #3 is reserved", chip = "LPstar"),
+        Flag(2, "PACTL_GPIO", warn = "For LPstar bit #2 is reserved", chip = "LPstar"),
+        *flags("SPI_3_PIN", "IRQ_GPIO"),
+    ),
+    0x0E: Bitfield(
+        *flags("XOUT_OP", "MISO_OP", None, None, None, None, None, None),
+        Flag(5, "PACTL_OP", warn = "For LPstar bit #5 is reserved", chip = "LPstar"),
+        *flags("IRQ_OP", "XOUT_IP", "MISO_IP", None, None),
+        Flag(1, "PACTL_IP", warn = "For LPstar bit #1 is reserved", chip = "LPstar"),
+        Flag(0, "IRQ_IP"),
+    ),
+    0x0F: Bitfield(
+        Flag(7, "ACK_EN"),
+        Flag(5, "FRC_END_STATE"),
+        Enum(0x1C, {0x00: "END_STATE_SLEEP", 0x04: "END_STATE_IDLE",
+            0x08: "END_STATE_TXSYNTH", 0x0C: "END_STATE_RXSYNTH", 0x10: "END_STATE_RX"},
+            warn = "Transaction End State 0b{0:b} not defined"),
+        Enum(0x03, {0x00: "ACK_TO_4X", 0x01: "ACK_TO_8X",
+            0x02: "ACK_TO_12X", 0x03: "ACK_TO_15X"}),
+    ),
+    0x10: Bitfield(
+        Flag(7, "SOP_EN"),
+        Flag(6, "SOP_LEN"),
+        Warn(lambda v: (v & 0x40) and ((v & 0x1F) != 0x0E),
+            "Typical applications configure SOP_THRESH = 0x0E for SOP64"),
+        # When SOP_LEN is cleared, the most significant bit is disregarded
+        Warn(lambda v: not (v & 0x40) and (((v & 0x1F) | 1) != (0x04 | 1)),
+            "Typical applications configure SOP_THRESH = 0x04 for SOP32"),
+        Flag(5, "LEN_EN"),
+        Value(0x1F, "SOP_THRESH_{0:#04x}"),
+    ),
+    0x11: Bitfield(Value(0x0F, "0x{0:02X}")),
+    0x12: Bitfield(Value(0x1F, "0x{0:02X}")),
+    0x13: Bitfield(
+        Flag(7, "SOP_RSSI"),
+        Flag(5, "LNA_STATE"),
+        Value(0x1F, "RSSI_LVL_{0:#04x}"),
+    ),
+    0x14: Bitfield(
+        Flag(7, "HINT_EN"),
+        Warn(lambda v: (v & 0x80) and ((v & 0x70) == 0), "EOP Hint Symbol Count cannot be 0"),
+        Value(0x70, "HINT_{}", shift = 4),
+        Value(0x0F, "EOP_{}"),
+    ),
+    0x1C: Bitfield(Value(0x0F, "0x{0:02X}")),
+    0x1D: Bitfield(
+        Flag(7, "RSVD_DIS_AUTO_SEN", warn = "bit #7 RSVD, must be 0"), # TODO: Verify name
+        Flag(6, "RSVD_SEN_TXRXB", warn = "bit #6 RSVD, must be 0"), # TODO: Verify name
+        Flag(5, "FRC_SEN"),
+        Enum(0x18, {0x18: "FRC_AWAKE", 0x08: "FRC_AWAKE_OFF_1", 0x00: "FRC_AWAKE_OFF_2"},
+            default = "FRC_AWAKE_OFF_X", warn = "Unknown FRC_AWAKE mode"), # TODO: check docu
+        Flag(0, "RST"),
+    ),
+    0x1E: Bitfield(*flags("ACK_RX", "RXTX_DLY", "MAN_RXACK", "FRC_RXDR", # RXTX_DLY aka EXTEND_RX_TX
+        "DIS_CRC0", "DIS_RXCRC", "ACE", None)),
+    0x1F: Bitfield(
+        *flags("ACK_TX_SEN", "FRX_PREAMBLE", None, None, None, None, None, None),
+        Flag(5, "RSVD_DIS_TX_RETRANS", warn = "bit #5 RSVD, must be 0"), # TODO: Verify name
+        *flags("MAN_TXACK", "OVRRD_ACK", "DIS_TXRC", None, None),
+        Flag(1, "RSVD_CO", warn = "bit #1 RSVD, must be 0"), # TODO: Verify name
+        Flag(0, "TXINV"),
+    ),
+    0x26: Bitfield(
+        Flag(3, "START_DLY"),
+        Warn(lambda v: not (v & 0x08) and (v != 0), "bits #7:4,2:0 RSVD, must be 0"),
+    ),
+    0x27: Bitfield(
+        Flag(1, "RXF"),
+        Warn(lambda v: not (v & 0x02) and (v != 0), "bits #7:2,0 RSVD, must be 0"),
+    ),
+    0x28: Bitfield(
+        Flag(1, "RXF"),
+        Warn(lambda v: not (v & 0x02) and (v != 0), "bits #7:2,0 RSVD, must be 0"),
+    ),
+    0x29: Bitfield(
+        Flag(5, "ABORT_EN"),
+        Warn(lambda v: not (v & 0x20) and (v != 0), "bits #7:6,4:0 RSVD, must be 0"),
+    ),
+    0x32: Bitfield(
+        Enum(0xFF, {0x3C: "AUTO_CAL_TIME_MAX"}, default = "{0:#0x}",
+            warn = "Firmware MUST write 0x3C to this register during initialization."),
+    ),
+    0x35: Bitfield(
+        Enum(0xFF, {0x14: "AUTO_CAL_OFFSET_MINUS_4"}, default = "{0:#0x}",
+            warn = "Firmware MUST write 0x14 to this register during initialization."),
+    ),
+    0x39: Bitfield(
+        Flag(1, "RX_INV"),
+        Flag(0, "ALL_SLOW"),
+        Warn(lambda v: (v & 0b11111100) != 0, "bits #7:2 RSVD, must be 0"),
+    ),
+}
+
+RegDecode(regs, schemas)
 
 @RDecode
 def reg_0x00(v = 0x48):
@@ -101,518 +255,19 @@ def reg_0x00(v = 0x48):
     else:
         return m, w
 
-# TODO: Programmatical approach for this kind of register decoding?
-@RDecode
-def reg_0x02(v = 0x03):
-    bf = []
-    if ((v & 1<<7) != 0): bf.append("TX_GO")
-    if ((v & 1<<6) != 0): bf.append("TX_CLR")
-    if ((v & 1<<5) != 0): bf.append("TXB15_IRQEN")
-    if ((v & 1<<4) != 0): bf.append("TXB8_IRQEN")
-    if ((v & 1<<3) != 0): bf.append("TXB0_IRQEN")
-    if ((v & 1<<2) != 0): bf.append("TXBERR_IRQEN")
-    if ((v & 1<<1) != 0): bf.append("TXC_IRQEN")
-    if ((v & 1<<0) != 0): bf.append("TXE_IRQEN")
-    return ' | '.join(bf)
-
-@RDecode
-def reg_0x03(v = 0x05, type="LP"):
-    bf = []
-    warn = []
-    if ((v & 1<<5) != 0): bf.append("DATCODE_LEN_64")
-    else: bf.append("DATCODE_LEN_32")
-
-    if  ((v & 0x18) == 0x00): bf.append("DATMODE_1MBPS")
-    elif ((v & 0x18) == 0x08): bf.append("DATMODE_8DR")
-    elif ((v & 0x18) == 0x10):
-        bf.append("DATMODE_DDR")
-        if (type != "LP"):
-            warn.append("DATMODE_DDR not supported on LPStar")
-    elif ((v & 0x18) == 0x18):
-        bf.append("DATMODE_SDR")
-        if (type != "LP"):
-            warn.append("DATMODE_SDR not supported on LPStar")
-    if  ((v & 0x07) == 0x00): bf.append("PA_N30_DBM")
-    elif ((v & 0x07) == 0x01): bf.append("PA_N25_DBM")
-    elif ((v & 0x07) == 0x02): bf.append("PA_N20_DBM")
-    elif ((v & 0x07) == 0x03): bf.append("PA_N15_DBM")
-    elif ((v & 0x07) == 0x04): bf.append("PA_N10_DBM")
-    elif ((v & 0x07) == 0x05): bf.append("PA_N5_DBM")
-    elif ((v & 0x07) == 0x06): bf.append("PA_0_DBM")
-    elif ((v & 0x07) == 0x07): bf.append("PA_4_DBM")
-
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-@RDecode
-def reg_0x04(v):
-    bf = []
-    if ((v & 1<<7) != 0): bf.append("XS_IRQ")
-    if ((v & 1<<6) != 0): bf.append("LV_IRQ")
-    if ((v & 1<<5) != 0): bf.append("TXB15_IRQ")
-    if ((v & 1<<4) != 0): bf.append("TXB8_IRQ")
-    if ((v & 1<<3) != 0): bf.append("TXB0_IRQ")
-    if ((v & 1<<2) != 0): bf.append("TXBERR_IRQ")
-    if ((v & 1<<1) != 0): bf.append("TXC_IRQ")
-    if ((v & 1<<0) != 0): bf.append("TXE_IRQ")
-    return ' | '.join(bf)
-
-@RDecode
-def reg_0x05(v = 0x07):
-    bf = []
-    warn = []
-    if ((v & 1<<7) != 0): bf.append("RX_GO")
-    if ((v & 1<<6) != 0): warn.append("RSVD bit #6 not 0")
-    if ((v & 1<<5) != 0): bf.append("RXB16_IRQEN")
-    if ((v & 1<<4) != 0): bf.append("RXB8_IRQEN")
-    if ((v & 1<<3) != 0): bf.append("RXB1_IRQEN")
-    if ((v & 1<<2) != 0): bf.append("RXBERR_IRQEN")
-    if ((v & 1<<1) != 0): bf.append("RXC_IRQEN")
-    if ((v & 1<<0) != 0): bf.append("RXE_IRQEN")
-
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-@RDecode
-def reg_0x06(v = 0x92):
-    bf = []
-    if ((v & 1<<7) != 0): bf.append("AUTO_AGC_EN")
-    if ((v & 1<<6) != 0): bf.append("LNA_EN")
-    if ((v & 1<<5) != 0): bf.append("ATT_EN")
-    if ((v & 1<<4) != 0):
-        bf.append("HI")
-    else:
-        bf.append("LO")
-    if ((v & 1<<3) != 0): bf.append("FASTTURN_EN")
-    if ((v & 1<<1) != 0): bf.append("RXOW_EN")
-    if ((v & 1<<0) != 0): bf.append("VLD_EN")
-    return ' | '.join(bf)
-
-@RDecode
-def reg_0x07(v):
-    bf = []
-    if ((v & 1<<7) != 0): bf.append("RXOW_IRQ")
-    if ((v & 1<<6) != 0): bf.append("SOFTDET_IRQ")
-    if ((v & 1<<5) != 0): bf.append("RXB16_IRQ")
-    if ((v & 1<<4) != 0): bf.append("RXB8_IRQ")
-    if ((v & 1<<3) != 0): bf.append("RXB1_IRQ")
-    if ((v & 1<<2) != 0): bf.append("RXBERR_IRQ")
-    if ((v & 1<<1) != 0): bf.append("RXC_IRQ")
-    if ((v & 1<<0) != 0): bf.append("RXE_IRQ")
-
-    return ' | '.join(bf)
-
-@RDecode
-def reg_0x08(v):
-    bf = []
-    warn = []
-    if ((v & 1<<7) != 0): bf.append("RX_ACK")
-    if ((v & 1<<6) != 0): bf.append("RX_PKTERR")
-    if ((v & 1<<5) != 0): bf.append("RX_EOPERR")
-    if ((v & 1<<4) != 0): bf.append("RX_CRC0")
-    if ((v & 1<<3) != 0): bf.append("RX_BAD_CRC")
-    if ((v & 1<<2) != 0): bf.append("DATCODE_LEN_64")
-    else: bf.append("DATCODE_LEN_32")
-    if  ((v & 0b11) == 0b00): bf.append("DATMODE_1MBPS")
-    elif ((v & 0b11) == 0b01): bf.append("DATMODE_8DR")
-    elif ((v & 0b11) == 0b10): bf.append("DATMODE_DDR")
-    elif ((v & 0b11) == 0b11):
-        bf.append("0b11")
-        warn.append("Receive Data Mode 0b11 not valid")
-
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-@RDecode
-def reg_0x0B(v = 0xA0, type="LP"):
-    bf = []
-    warn = []
-    if ((v & 1<<7) != 0): bf.append("PMU_EN")
-    if ((v & 1<<6) != 0): bf.append("LV_IRQ_EN")
-    if ((v & 1<<5) != 0): bf.append("PMU_MODE_FORCE")
-    if ((v & 1<<4) != 0): bf.append("PFET_OFF")
-
-    if  ((v & 0x0C) == 0x0C): bf.append("LV_IRQ_TH_1P8_V")
-    elif  ((v & 0x0C) == 0x08): bf.append("LV_IRQ_TH_2P0_V")
-    elif  ((v & 0x0C) == 0x04): bf.append("LV_IRQ_TH_2P2_V")
-    elif  ((v & 0x0C) == 0x00): bf.append("LV_IRQ_TH_PMU_OUTV")
-
-    if  ((v & 0x03) == 0x03): bf.append("PMU_OUTV_2P4")
-    elif  ((v & 0x03) == 0x02): bf.append("PMU_OUTV_2P5")
-    elif  ((v & 0x03) == 0x01): bf.append("PMU_OUTV_2P6")
-    elif  ((v & 0x03) == 0x00): bf.append("PMU_OUTV_2P7")
-
-    if type == "LPstar" and v != 0b00010000:
-        warn.append("The firmware should set 0b00010000 to this register while initiating")
-
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-@RDecode
-def reg_0x0C(v = 0x04):
-    bf = []
-    warn = []
-
-    if  ((v & 0xC0) == 0x00): bf.append("XOUT_FNC_XOUT_FREQ")
-    elif  ((v & 0xC0) == 0x40): bf.append("XOUT_FNC_PA_N")
-    elif  ((v & 0xC0) == 0x80): bf.append("XOUT_FNC_RAD_STREAM")
-    elif  ((v & 0xC0) == 0xC0): bf.append("XOUT_FNC_GPIO")
-
-    if ((v & 1<<5) != 0): bf.append("XS_IRQ_EN")
-
-    if  ((v & 0x07) == 0x00): bf.append("XOUT_FREQ_12MHZ")
-    elif  ((v & 0x07) == 0x01): bf.append("XOUT_FREQ_6MHZ")
-    elif  ((v & 0x07) == 0x02): bf.append("XOUT_FREQ_3MHZ")
-    elif  ((v & 0x07) == 0x03): bf.append("XOUT_FREQ_1P5MHZ")
-    elif  ((v & 0x07) == 0x04): bf.append("XOUT_FREQ_P75MHZ")
-    else:
-        bf.append("0b{0:b}".format(v&0x07))
-        warn.append("Frequency setting 0b{0:b} not defined".format(v&0x07))
-
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-@RDecode
-def reg_0x0D(v = 0x00, type = "LP"):
-    bf = []
-    warn = []
-    if ((v & 1<<7) != 0): bf.append("IRQ_OD")
-    if ((v & 1<<6) != 0): bf.append("IRQ_POL")
-    if ((v & 1<<5) != 0): bf.append("MISO_OD")
-    if ((v & 1<<4) != 0): bf.append("XOUT_OD")
-    if ((v & 1<<3) != 0):
-        bf.append("PACTL_OD")
-        if type == "LPstar":
-            warn.append("For LPstar bit #3 is reserved")
-    if ((v & 1<<2) != 0):
-        bf.append("PACTL_GPIO")
-        if type == "LPstar":
-            warn.append("For LPstar bit #2 is reserved")
-    if ((v & 1<<1) != 0): bf.append("SPI_3_PIN")
-    if ((v & 1<<0) != 0): bf.append("IRQ_GPIO")
-
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-@RDecode
-def reg_0x0E(v = 0x00, type = "LP"):
-    bf = []
-    warn = []
-    if ((v & 1<<7) != 0): bf.append("XOUT_OP")
-    if ((v & 1<<6) != 0): bf.append("MISO_OP")
-    if ((v & 1<<5) != 0):
-        bf.append("PACTL_OP")
-        if type == "LPstar":
-            warn.append("For LPstar bit #5 is reserved")
-    if ((v & 1<<4) != 0): bf.append("IRQ_OP")
-    if ((v & 1<<3) != 0): bf.append("XOUT_IP")
-    if ((v & 1<<2) != 0): bf.append("MISO_IP")
-    if ((v & 1<<1) != 0):
-        bf.append("PACTL_IP")
-        if type == "LPstar":
-            warn.append("For LPstar bit #1 is reserved")
-    if ((v & 1<<0) != 0): bf.append("IRQ_IP")
-
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-@RDecode
-def reg_0x0F(v = 0x80):
-    bf = []
-    warn = []
-    if ((v & 1<<7) != 0): bf.append("ACK_EN")
-    if ((v & 1<<5) != 0): bf.append("FRC_END_STATE")
-
-    if  ((v & 0x1C) == 0x00): bf.append("END_STATE_SLEEP")
-    elif  ((v & 0x1C) == 0x04): bf.append("END_STATE_IDLE")
-    elif  ((v & 0x1C) == 0x08): bf.append("END_STATE_TXSYNTH")
-    elif  ((v & 0x1C) == 0x0C): bf.append("END_STATE_RXSYNTH")
-    elif  ((v & 0x1C) == 0x10): bf.append("END_STATE_RX")
-    else:
-        warn.append("Transaction End State 0b{0:b} not defined".format(v&0x1C))
-
-    if  ((v & 0x03) == 0x00): bf.append("ACK_TO_4X")
-    elif  ((v & 0x03) == 0x01): bf.append("ACK_TO_8X")
-    elif  ((v & 0x03) == 0x02): bf.append("ACK_TO_12X")
-    elif  ((v & 0x03) == 0x03): bf.append("ACK_TO_15X")
-
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-@RDecode
-def reg_0x10(v = 0xA5):
-    bf = []
-    warn = []
-    SOP_THRESH = (v & 0x1F)
-    if ((v & 1<<7) != 0): bf.append("SOP_EN")
-    if ((v & 1<<6) != 0):
-        bf.append("SOP_LEN")
-        if SOP_THRESH != 0x0E:
-            warn.append("Typical applications configure SOP_THRESH = 0x0E for SOP64")
-    else:
-        if (SOP_THRESH | 1) != (0x04 | 1): # When SOP_LEN is cleared, the most significant bit is disregarded
-            warn.append("Typical applications configure SOP_THRESH = 0x04 for SOP32")
-    if ((v & 1<<5) != 0): bf.append("LEN_EN")
-
-    bf.append("SOP_THRESH_{0:#04x}".format(SOP_THRESH))
-
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-@RDecode
-def reg_0x11(v = 0x04):
-    return v & 0x0f
-
-@RDecode
-def reg_0x12(v = 0x0a):
-    return v & 0x1f
-
-@RDecode
-def reg_0x13(v = 0x20):
-    bf = []
-    if ((v & 1<<7) != 0): bf.append("SOP_RSSI")
-    if ((v & 1<<5) != 0): bf.append("LNA_STATE")
-
-    bf.append("RSSI_LVL_{0:#04x}".format(v & 0x1f))
-
-    return ' | '.join(bf)
-
-@RDecode
-def reg_0x14(v = 0xA4):
-    bf = []
-    warn = []
-    HINT = (v & 0x70) >> 4
-    EOP = (v & 0x0f)
-    if ((v & 1<<7) != 0):
-        bf.append("HINT_EN")
-        if HINT == 0:
-            warn.append("EOP Hint Symbol Count cannot be 0")
-
-    bf.append("HINT_{}".format(HINT))
-    bf.append("EOP_{}".format(EOP))
-
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-@RDecode
-def reg_0x1C(v = 0x00):
-    return v & 0x0f
-
-@RDecode
-def reg_0x1D(v = 0x00):
-    bf = []
-    warn = []
-    if ((v & 1<<7) != 0):
-        bf.append("RSVD_DIS_AUTO_SEN") # TODO: Verify name
-        warn.append("bit #7 RSVD, must be 0")
-    if ((v & 1<<6) != 0):
-        bf.append("RSVD_SEN_TXRXB") # TODO: Verify name
-        warn.append("bit #6 RSVD, must be 0")
-    if ((v & 1<<5) != 0): bf.append("FRC_SEN")
-
-    if ((v & 0x18) == 0x18):
-        bf.append("FRC_AWAKE")
-    elif ((v & 0x18) == 0x08):
-        bf.append("FRC_AWAKE_OFF_1")
-    elif ((v & 0x18) == 0x00):
-        bf.append("FRC_AWAKE_OFF_2")
-    else:
-        bf.append("FRC_AWAKE_OFF_X") # TODO: check docu
-        warn.append("Unknown FRC_AWAKE mode")
-
-    if ((v & 1<<0) != 0): bf.append("RST")
-
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-@RDecode
-def reg_0x1E(v = 0x00):
-    bf = []
-    if ((v & 1<<7) != 0): bf.append("ACK_RX")
-    if ((v & 1<<6) != 0): bf.append("RXTX_DLY") # aka EXTEND_RX_TX
-    if ((v & 1<<5) != 0): bf.append("MAN_RXACK")
-    if ((v & 1<<4) != 0): bf.append("FRC_RXDR")
-    if ((v & 1<<3) != 0): bf.append("DIS_CRC0")
-    if ((v & 1<<2) != 0): bf.append("DIS_RXCRC")
-    if ((v & 1<<1) != 0): bf.append("ACE")
-
-    return ' | '.join(bf)
-
-@RDecode
-def reg_0x1F(v = 0x00):
-    bf = []
-    warn = []
-    if ((v & 1<<7) != 0): bf.append("ACK_TX_SEN")
-    if ((v & 1<<6) != 0): bf.append("FRX_PREAMBLE")
-    if ((v & 1<<5) != 0):
-        bf.append("RSVD_DIS_TX_RETRANS") # TODO: Verify name
-        warn.append("bit #5 RSVD, must be 0")
-    if ((v & 1<<4) != 0): bf.append("MAN_TXACK")
-    if ((v & 1<<3) != 0): bf.append("OVRRD_ACK")
-    if ((v & 1<<2) != 0): bf.append("DIS_TXRC")
-    if ((v & 1<<1) != 0):
-        bf.append("RSVD_CO") # TODO: Verify name
-        warn.append("bit #1 RSVD, must be 0")
-    if ((v & 1<<0) != 0): bf.append("TXINV")
-
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-@RDecode
-def reg_0x26(v = 0x00):
-    bf = []
-    warn = []
-    if ((v & 1<<3) != 0): bf.append("START_DLY")
-    elif (v != 0):
-        warn.append("bits #7:4,2:0 RSVD, must be 0")
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-@RDecode
-def reg_0x27(v = 0x00):
-    bf = []
-    warn = []
-    if ((v & 1<<1) != 0): bf.append("RXF")
-    elif (v != 0):
-        warn.append("bits #7:2,0 RSVD, must be 0")
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-@RDecode
-def reg_0x28(v = 0x00):
-    bf = []
-    warn = []
-    if ((v & 1<<1) != 0): bf.append("RXF")
-    elif (v != 0):
-        warn.append("bits #7:2,0 RSVD, must be 0")
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-@RDecode
-def reg_0x29(v = 0x00):
-    bf = []
-    warn = []
-    if ((v & 1<<5) != 0): bf.append("ABORT_EN")
-    elif (v != 0):
-        warn.append("bits #7:6,4:0 RSVD, must be 0")
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-@RDecode
-def reg_0x32(v = 0x0C):
-    bf = []
-    warn = []
-    if (v == 0x3C):
-        bf.append("AUTO_CAL_TIME_MAX")
-    else:
-        bf.append("{0:#0x}".format(v))
-        warn.append("Firmware MUST write 0x3C to this register during initialization.")
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-
-@RDecode
-def reg_0x35(v = 0x00):
-    bf = []
-    warn = []
-    if (v == 0x14):
-        bf.append("AUTO_CAL_OFFSET_MINUS_4")
-    else:
-        bf.append("{0:#0x}".format(v))
-        warn.append("Firmware MUST write 0x14 to this register during initialization.")
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
-@RDecode
-def reg_0x39(v = 0x00):
-    bf = []
-    warn = []
-    if ((v & 1<<1) != 0): bf.append("RX_INV")
-    if ((v & 1<<0) != 0): bf.append("ALL_SLOW")
-    if ((v & 0b11111100) != 0):
-        warn.append("bits #7:2 RSVD, must be 0")
-    w = ""
-    if len(warn) > 0:
-        w = "Warn: "
-        w += '; '.join(warn)
-
-    return ' | '.join(bf), w
-
 
 if __name__ == '__main__':
     # Test code follows:
     print(RegDecode.decode(0x00, 0x48))
     print(RegDecode.valid(0xff))
+    print(RegDecode.decode("CHANNEL_ADR", "0x48"))
     print(RegDecode.width(0x20))
+    # Self check against the output of the original decoder functions.
+    import os
+    import sys
+    expected = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'samples', 'registers-LP.txt')
+    mismatches = RegDecode.check_tables(expected)
+    for r, v, e, d in mismatches:
+        print('0x{:02X} = 0x{:02X}: expected {}, decoded {}'.format(r, v, e, d))
+    if mismatches:
+        sys.exit('{} register values decoded differently'.format(len(mismatches)))
@@ -0,0 +1,279 @@
+##
+## Copyright (C) 2016 Soenke J. Peters
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Reads sigrok session files (.srzip) and decodes the SPI bus in them with
+NumPy, producing the events the 'spi' PD would put.
+'''
+
+import configparser
+import mmap
+import os
+import re
+import zipfile
+
+import numpy as np
+
+WINDOW = 1 << 20 # samples per window when streaming
+
+def parse_samplerate(s):
+    '''Converts a samplerate like '250 kHz' to Hz.'''
+    m = re.match(r'^\s*([0-9.]+)\s*([kMG]?)Hz\s*$', s)
+    if m is None:
+        raise ValueError('Invalid samplerate "{}"'.format(s))
+    return int(float(m.group(1)) * {'': 1, 'k': 10**3, 'M': 10**6, 'G': 10**9}[m.group(2)])
+
+def mapped_windows(path, dtype, size = WINDOW, start = 0, stop = None):
+    '''Yields the samples 'start' to 'stop' of the raw file 'path' in
+    windows of 'size' samples, memory-mapped. Pages of finished windows
+    are released, so the resident memory stays bounded.'''
+    dtype = np.dtype(dtype)
+    with open(path, 'rb') as f:
+        length = os.fstat(f.fileno()).st_size // dtype.itemsize
+        if stop is None or stop > length:
+            stop = length
+        if start >= stop:
+            return
+        mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        try:
+            for pos in range(start, stop, size):
+                count = min(size, stop - pos)
+                window = np.frombuffer(mm, dtype = dtype, count = count, offset = pos * dtype.itemsize)
+                yield window
+                del window
+                if hasattr(mm, 'madvise'):
+                    end = (pos + count) * dtype.itemsize
+                    mm.madvise(mmap.MADV_DONTNEED, 0, end - end % mmap.PAGESIZE)
+        finally:
+            try:
+                mm.close()
+            except BufferError:
+                # Still referenced by a window, freed along with it.
+                pass
+
+class RawCapture():
+    '''A raw logic dump with 'unitsize' bytes per sample.'''
+
+    def __init__(self, path, unitsize, samplerate):
+        self.path = path
+        self.unitsize = unitsize
+        self.samplerate = samplerate
+        self.dtype = np.dtype('<u{}'.format(unitsize))
+        self.channels = {}
+        self.length = os.path.getsize(path) // unitsize
+
+    def channel(self, *names):
+        return None
+
+    def samples(self):
+        '''Returns all logic samples as a (memory-mapped) NumPy array.'''
+        return np.memmap(self.path, dtype = self.dtype, mode = 'r')
+
+    def windows(self, size = WINDOW, start = 0, stop = None):
+        '''Yields the logic samples 'start' to 'stop' in windows of at most
+        'size' samples.'''
+        return mapped_windows(self.path, self.dtype, size, start, stop)
+
+class SrZip():
+    '''A sigrok session file with logic data, either the .srzip file or a
+    directory it was unpacked to.'''
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.isdir(path):
+            self.zip = None
+            names = os.listdir(path)
+        else:
+            self.zip = zipfile.ZipFile(path)
+            names = self.zip.namelist()
+        metadata = configparser.ConfigParser()
+        metadata.read_string(self.read('metadata').decode())
+        device = metadata['device 1']
+        self.samplerate = parse_samplerate(device['samplerate'])
+        self.unitsize = int(device['unitsize'])
+        self.dtype = np.dtype('<u{}'.format(self.unitsize))
+        self.channels = {}
+        for key, name in device.items():
+            if key.startswith('probe'):
+                self.channels[name] = int(key[5:]) - 1
+
+        prefix = device['capturefile'] + '-'
+        chunks = [n for n in names if n.startswith(prefix)]
+        self.chunks = sorted(chunks, key = lambda n: int(n[len(prefix):]))
+        if not self.chunks and device['capturefile'] in names:
+            self.chunks = [device['capturefile']]
+        # Number of samples in each chunk.
+        if self.zip is None:
+            self.lengths = [os.path.getsize(os.path.join(path, n)) // self.unitsize for n in self.chunks]
+        else:
+            self.lengths = [self.zip.getinfo(n).file_size // self.unitsize for n in self.chunks]
+        self.length = sum(self.lengths)
+
+    def read(self, name):
+        '''Returns the content of the member 'name'.'''
+        if self.zip is None:
+            with open(os.path.join(self.path, name), 'rb') as f:
+                return f.read()
+        return self.zip.read(name)
+
+    def channel(self, *names):
+        '''Returns the bit number of the first existing channel of 'names',
+        or None.'''
+        for name in names:
+            if name in self.channels:
+                return self.channels[name]
+        return None
+
+    def samples(self):
+        '''Returns all logic samples as a NumPy array.'''
+        data = b''.join(self.read(n) for n in self.chunks)
+        return np.frombuffer(data, dtype = self.dtype)
+
+    def windows(self, size = WINDOW, start = 0, stop = None):
+        '''Yields the logic samples 'start' to 'stop' in windows of at most
+        'size' samples. Chunks of an unpacked session are memory-mapped,
+        chunks in the .srzip file are decompressed window by window.'''
+        if stop is None:
+            stop = self.length
+        offset = 0
+        for name, length in zip(self.chunks, self.lengths):
+            lo = max(start - offset, 0)
+            hi = min(stop - offset, length)
+            offset += length
+            if lo >= hi:
+                if offset >= stop:
+                    break
+                continue
+            if self.zip is None:
+                yield from mapped_windows(os.path.join(self.path, name), self.dtype, size, lo, hi)
+                continue
+            with self.zip.open(name) as f:
+                f.seek(lo * self.unitsize)
+                while lo < hi:
+                    data = f.read(min(size, hi - lo) * self.unitsize)
+                    if not data:
+                        break
+                    lo += len(data) // self.unitsize
+                    yield np.frombuffer(data, dtype = self.dtype)
+
+def open_capture(path, unitsize = None, samplerate = None):
+    '''Opens the session file or directory 'path', or the raw logic dump
+    'path' if 'unitsize' is given.'''
+    if unitsize is not None:
+        return RawCapture(path, unitsize, samplerate)
+    return SrZip(path)
+
+class SpiSampler():
+    '''Decodes the SPI bus in logic samples fed window by window, putting
+    the same events as the 'spi' PD. 'clk', 'cs' (active low), 'mosi' and
+    'miso' are channel bit numbers ('miso' may be None, e.g. with SDAT on
+    'mosi' in 3-pin mode). Words are 8 bits, MSB first, XORed with the
+    masks 'invert_mosi' and 'invert_miso'. The edges of a word split
+    across windows are carried over to the next window.'''
+
+    def __init__(self, clk, cs, mosi, miso = None, cpol = 0, cpha = 0, offset = 0,
+            invert_mosi = 0, invert_miso = 0):
+        self.clk = clk
+        self.cs = cs
+        self.mosi = mosi
+        self.miso = miso
+        self.invert_mosi = invert_mosi
+        self.invert_miso = invert_miso
+        self.edge = 1 if cpol == cpha else -1
+        # Sample number of the first sample of the next window.
+        self.offset = offset
+        # Last sample of the previous window.
+        self.last = None
+        # Sample numbers and MOSI/MISO bits of the edges of an incomplete
+        # word at the end of the previous window.
+        self.pending = np.zeros((3, 0), dtype = np.int64)
+
+    def feed(self, samples):
+        '''Returns the SPI events in the window 'samples', following the
+        previously fed windows.'''
+        events = []
+        if len(samples) == 0:
+            return events
+        if self.last is None:
+            events.append((self.offset, self.offset,
+                ('CS-CHANGE', None, int((samples[0] >> self.cs) & 1))))
+            self.last = samples[0]
+
+        # Prepend the last sample of the previous window, so edges on the
+        # window boundary are found. Index i is sample offset + i - 1.
+        s = np.concatenate((np.asarray([self.last], dtype = samples.dtype), samples))
+        def line(bit):
+            return ((s >> bit) & 1).astype(np.int8)
+        def bits(bit, idx):
+            if bit is None:
+                return np.zeros(len(idx), dtype = np.int64)
+            return ((s[idx] >> bit) & 1).astype(np.int64)
+        base = self.offset - 1
+
+        cs_line = line(self.cs)
+        # Clock edges data is sampled on, while CS# is low.
+        idx = np.flatnonzero(np.diff(line(self.clk)) == self.edge) + 1
+        idx = idx[cs_line[idx] == 0]
+        edges = np.concatenate((self.pending,
+            np.stack((idx + base, bits(self.mosi, idx), bits(self.miso, idx)))), axis = 1)
+        cs_idx = np.flatnonzero(np.diff(cs_line)) + 1
+
+        # Bit position of every edge within its CS# low period; incomplete
+        # words are dropped, except for the one of the period still going on.
+        period = np.searchsorted(cs_idx + base, edges[0], side = 'right')
+        starts = np.flatnonzero(np.diff(period, prepend = -1))
+        counts = np.diff(np.append(starts, edges.shape[1]))
+        pos = np.arange(edges.shape[1]) - np.repeat(starts, counts)
+        complete = (pos | 7) < np.repeat(counts, counts)
+        self.pending = edges[:, ~complete & (period == len(cs_idx))]
+        words = edges[:, complete].reshape(3, -1, 8)
+
+        ss = words[0, :, 0].tolist()
+        es = words[0, :, 7].tolist()
+        mosi = np.packbits(words[1].astype(np.uint8), axis = 1)[:, 0]
+        if self.invert_mosi:
+            mosi ^= self.invert_mosi
+        mosi = mosi.tolist()
+        if self.miso is None:
+            miso = [None] * len(ss)
+        else:
+            miso = np.packbits(words[2].astype(np.uint8), axis = 1)[:, 0]
+            if self.invert_miso:
+                miso ^= self.invert_miso
+            miso = miso.tolist()
+        cs_levels = cs_line[cs_idx].tolist()
+
+        # Merge the words and CS# changes in sample order.
+        w = 0
+        for e, level in zip((cs_idx + base).tolist(), cs_levels):
+            while w < len(ss) and ss[w] < e:
+                events.append((ss[w], es[w], ('DATA', mosi[w], miso[w])))
+                w += 1
+            events.append((e, e, ('CS-CHANGE', 1 - level, level)))
+        while w < len(ss):
+            events.append((ss[w], es[w], ('DATA', mosi[w], miso[w])))
+            w += 1
+
+        self.last = samples[-1]
+        self.offset += len(samples)
+        return events
+
+def spi_events(samples, clk, cs, mosi, miso = None, cpol = 0, cpha = 0,
+        invert_mosi = 0, invert_miso = 0):
+    '''Returns the events the 'spi' PD puts for the logic 'samples', see
+    SpiSampler.'''
+    return SpiSampler(clk, cs, mosi, miso, cpol, cpha,
+        invert_mosi = invert_mosi, invert_miso = invert_miso).feed(samples)
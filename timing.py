@@ -0,0 +1,226 @@
+##
+## Copyright (C) 2016 Soenke J. Peters
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Streaming timing statistics: CS# gaps, transaction durations and the
+latency of radio packets, with percentiles in bounded memory.
+'''
+
+import json
+from math import ceil, log
+
+# Percentiles in reports and summaries.
+QUANTILES = (0.5, 0.9, 0.99)
+
+class QuantileSketch():
+    '''Count, sum, minimum, maximum and approximate quantiles of a series
+    of non-negative values. Values are counted in logarithmic buckets, so
+    every quantile is within the relative error 'alpha' of the exact one
+    (as in DDSketch). At most 'max_buckets' buckets are kept; beyond that
+    the lowest ones are merged, losing accuracy for the smallest values
+    only.'''
+
+    def __init__(self, alpha = 0.01, max_buckets = 2048):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = log(self.gamma)
+        self.inv_log_gamma = 1 / self.log_gamma
+        self.max_buckets = max_buckets
+        # Counts by bucket, bucket i holding values in (gamma**(i-1), gamma**i].
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def __len__(self):
+        return self.count
+
+    def add(self, v):
+        self.count += 1
+        self.sum += v
+        if self.min is None or v < self.min:
+            self.min = v
+        if self.max is None or v > self.max:
+            self.max = v
+        if v <= 0:
+            self.zeros += 1
+            return
+        i = ceil(log(v) * self.inv_log_gamma)
+        buckets = self.buckets
+        try:
+            buckets[i] += 1
+        except KeyError:
+            buckets[i] = 1
+            if len(buckets) > self.max_buckets:
+                self.collapse()
+
+    def collapse(self):
+        '''Merges the lowest buckets until at most 'max_buckets' are left.'''
+        keys = sorted(self.buckets)
+        excess = len(keys) - self.max_buckets
+        if excess <= 0:
+            return
+        low = keys[excess]
+        for i in keys[:excess]:
+            self.buckets[low] += self.buckets.pop(i)
+
+    def merge(self, other):
+        '''Adds the values counted by the QuantileSketch 'other', which
+        must have the same 'alpha'.'''
+        if not other.count:
+            return
+        self.count += other.count
+        self.sum += other.sum
+        self.zeros += other.zeros
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+        for i, n in other.buckets.items():
+            self.buckets[i] = self.buckets.get(i, 0) + n
+        if len(self.buckets) > self.max_buckets:
+            self.collapse()
+
+    def quantile(self, q):
+        '''Returns the approximate 'q' quantile (0 to 1), or None if no
+        values were added.'''
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0
+        n = self.zeros
+        for i in sorted(self.buckets):
+            n += self.buckets[i]
+            if n > rank:
+                v = 2 * self.gamma ** i / (self.gamma + 1)
+                return min(max(v, self.min), self.max)
+        return self.max
+
+    def report(self, scale = 1):
+        '''Returns the statistics as a dict, with the values multiplied
+        by 'scale'.'''
+        if not self.count:
+            return {'count': 0}
+        r = {
+            'count': self.count,
+            'min': self.min * scale,
+            'max': self.max * scale,
+            'mean': self.sum / self.count * scale,
+        }
+        for q in QUANTILES:
+            r['p{:g}'.format(q * 100)] = self.quantile(q) * scale
+        return r
+
+class TimingStats():
+    '''QuantileSketches of the CS# gaps ('cs_gap'), the packet latencies
+    ('tx_latency', 'rx_latency', see PacketAssembler) and the durations
+    of the transactions by (addr, dir_wr), all in samples.
+
+    Values are added to the sketches of the current window. roll() ends
+    the window, merging it into the totals, so a summary of the window
+    costs nothing per value.'''
+
+    def __init__(self, alpha = 0.01):
+        self.alpha = alpha
+        self.window = {}
+        self.totals = {}
+        # Samplerate of the reports, if known.
+        self.samplerate = None
+
+    def add(self, key, v):
+        try:
+            s = self.window[key]
+        except KeyError:
+            s = self.window[key] = QuantileSketch(self.alpha)
+        s.add(v)
+
+    def transaction(self, ss, es, addr, dir_wr, inc, data):
+        '''Transaction hook, see Decoder.transaction_hooks.'''
+        self.add((addr, dir_wr), es - ss)
+
+    def gap(self, ss, es):
+        '''Adds the CS# gap from 'ss' to 'es'.'''
+        self.add('cs_gap', es - ss)
+
+    def packet(self, packet):
+        '''Adds the latency of a packet, see PacketAssembler.'''
+        latency = packet[7]
+        if latency is not None:
+            self.add('tx_latency' if packet[0] == 'TX' else 'rx_latency', latency)
+
+    def roll(self):
+        '''Ends the current window, returning its sketches by key.'''
+        window, self.window = self.window, {}
+        for key, s in window.items():
+            try:
+                self.totals[key].merge(s)
+            except KeyError:
+                total = self.totals[key] = QuantileSketch(self.alpha)
+                total.merge(s)
+        return window
+
+    def summary(self, window, samplerate = None):
+        '''Returns a line of text with the percentiles of the sketches
+        'window' (see roll()), the transactions taken together.'''
+        scale, unit = units(samplerate)
+        transactions = QuantileSketch(self.alpha)
+        parts = []
+        for key, s in window.items():
+            if isinstance(key, tuple):
+                transactions.merge(s)
+        for name, s in (('cs_gap', window.get('cs_gap')), ('transaction', transactions),
+                ('tx_latency', window.get('tx_latency')), ('rx_latency', window.get('rx_latency'))):
+            if not s:
+                continue
+            parts.append('{}(n={}, {}, max={:.2f}{})'.format(name, s.count,
+                ', '.join('p{:g}={:.2f}{}'.format(q * 100, s.quantile(q) * scale, unit) for q in QUANTILES),
+                s.max * scale, unit))
+        return 'timing({})'.format(', '.join(parts))
+
+    def report(self, samplerate = None):
+        '''Ends the current window and returns the statistics of all
+        windows as a dict, with times in us if the samplerate (or
+        'self.samplerate') is known, in samples otherwise.'''
+        from .regdecode import RegDecode
+        self.roll()
+        scale, unit = units(samplerate or self.samplerate)
+        r = {'unit': unit.strip() or 'samples'}
+        transactions = {}
+        for key, s in sorted(self.totals.items(), key = lambda kv: str(kv[0])):
+            if isinstance(key, tuple):
+                addr, dir_wr = key
+                name = '{} {}'.format(RegDecode.name(addr) or hex(addr), 'write' if dir_wr else 'read')
+                transactions[name] = s.report(scale)
+            else:
+                r[key] = s.report(scale)
+        r['transactions'] = transactions
+        return r
+
+    def save(self, path, samplerate = None):
+        '''Writes the report to the file 'path' as JSON.'''
+        with open(path, 'w') as f:
+            json.dump(self.report(samplerate), f, indent = 2, sort_keys = True)
+            f.write('\n')
+
+def units(samplerate):
+    '''Returns the factor from samples to the unit of the reports and the
+    unit's suffix.'''
+    if samplerate:
+        return 1000000 / samplerate, ' us'
+    return 1, ''
@@ -0,0 +1,155 @@
+##
+## Copyright (C) 2016 Soenke J. Peters
+##
+## This program is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Compact log of decoded register transactions: fixed width records in
+array-backed columns, with the payloads in a shared bytes arena.
+'''
+
+from array import array
+import struct
+import sys
+
+from .regdecode import RegDecode
+
+MAGIC = b'CYRFTXL\x01'
+HEADER = struct.Struct('<8sQQI')
+
+class TransactionLog():
+    '''Transactions as columns:
+
+    - ss, es: start and end sample
+    - addr: register address
+    - dir_wr: 1 = write, 0 = read
+    - inc: 1 = auto address increment
+    - offset, length: payload position in 'arena'
+    - warning: index into 'warnings', 0 = none
+    '''
+
+    columns = (
+        ('ss', 'q'),
+        ('es', 'q'),
+        ('addr', 'B'),
+        ('dir_wr', 'B'),
+        ('inc', 'B'),
+        ('offset', 'Q'),
+        ('length', 'H'),
+        ('warning', 'H'),
+    )
+
+    def __init__(self, chip = None):
+        # Chip type the warnings are looked up for.
+        self.chip = chip
+        for name, typecode in self.columns:
+            setattr(self, name, array(typecode))
+        self.arena = bytearray()
+        self.warnings = [None]
+        self.warning_codes = {None: 0}
+
+    def __len__(self):
+        return len(self.ss)
+
+    def warning_code(self, warn):
+        '''Returns the code of the warning text 'warn'.'''
+        try:
+            return self.warning_codes[warn]
+        except KeyError:
+            code = self.warning_codes[warn] = len(self.warnings)
+            self.warnings.append(warn)
+            return code
+
+    def append(self, ss, es, addr, dir_wr, inc, data, warn = None):
+        '''Appends a transaction with the payload 'data'. The warning is
+        looked up in the register tables unless given.'''
+        if warn is None:
+            warn = RegDecode.decode_bytes(addr, data, self.chip)[1]
+        self.ss.append(ss)
+        self.es.append(es)
+        self.addr.append(addr)
+        self.dir_wr.append(dir_wr)
+        self.inc.append(inc)
+        self.offset.append(len(self.arena))
+        self.length.append(len(data))
+        self.warning.append(self.warning_code(warn))
+        self.arena += data
+
+    def payload(self, i):
+        '''Returns the payload of transaction 'i'.'''
+        offset = self.offset[i]
+        return bytes(self.arena[offset:offset + self.length[i]])
+
+    def record(self, i):
+        '''Returns transaction 'i' as a tuple (ss, es, addr, dir_wr, inc,
+        payload, warning).'''
+        return (self.ss[i], self.es[i], self.addr[i], self.dir_wr[i], self.inc[i],
+            self.payload(i), self.warnings[self.warning[i]])
+
+    def records(self):
+        '''Yields all transactions as tuples, see record().'''
+        for i in range(len(self)):
+            yield self.record(i)
+
+    def nbytes(self):
+        '''Returns the size of the columns and the arena in bytes.'''
+        return sum(getattr(self, name).itemsize * len(self) for name, t in self.columns) + len(self.arena)
+
+    def dump(self, f):
+        '''Writes the log to the binary file object 'f'.'''
+        warnings = '\0'.join(w for w in self.warnings[1:]).encode()
+        f.write(HEADER.pack(MAGIC, len(self), len(self.arena), len(warnings)))
+        for name, typecode in self.columns:
+            column = getattr(self, name)
+            if sys.byteorder != 'little':
+                column = array(typecode, column)
+                column.byteswap()
+            f.write(column.tobytes())
+        f.write(self.arena)
+        f.write(warnings)
+
+    def save(self, path):
+        '''Writes the log to the file 'path'.'''
+        with open(path, 'wb') as f:
+            self.dump(f)
+
+    @classmethod
+    def load(cls, f):
+        '''Reads a log written by dump() from the binary file object 'f'.'''
+        magic, count, arena_len, warnings_len = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError('Not a transaction log')
+        log = cls()
+        for name, typecode in cls.columns:
+            column = getattr(log, name)
+            column.frombytes(f.read(column.itemsize * count))
+            if sys.byteorder != 'little':
+                column.byteswap()
+        log.arena = bytearray(f.read(arena_len))
+        warnings = f.read(warnings_len).decode()
+        if warnings:
+            for w in warnings.split('\0'):
+                log.warning_code(w)
+        return log
+
+    def to_numpy(self):
+        '''Returns the columns (and the arena as 'arena') as a dict of
+        NumPy arrays. They share the memory of the log, which cannot grow
+        while they exist.'''
+        import numpy as np
+        arrays = {}
+        for name, typecode in self.columns:
+            arrays[name] = np.frombuffer(getattr(self, name), dtype = typecode)
+        arrays['arena'] = np.frombuffer(self.arena, dtype = np.uint8)
+        return arrays